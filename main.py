@@ -1,8 +1,13 @@
+import time
+
+startup_time = time.perf_counter()
+
 import tkinter as tk
 from tkinter import messagebox
 from dotenv import load_dotenv
 import sys
 import argparse
+import logging
 
 import sv_ttk
 from src.gui.fashionAssistantGUI import FashionAssistantGUI
@@ -18,7 +23,28 @@ if __name__ == "__main__":
         action="store_true",
         help="Disable long-term retrieval for the assistant",
     )
+    parser.add_argument(
+        "--response-cache",
+        action="store_true",
+        help="Reuse outfits generated for similar requests",
+    )
+    parser.add_argument(
+        "--candidates",
+        type=int,
+        default=1,
+        help="Number of outfits to choose from per recommendation",
+    )
+    parser.add_argument(
+        "--verbose",
+        "-v",
+        action="store_true",
+        help="Log latency and model routing metrics",
+    )
     args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(name)s: %(message)s",
+    )
 
     root = tk.Tk()
 
@@ -31,6 +57,14 @@ if __name__ == "__main__":
     # NOTE: does not do anything yet. Need to migrate from Tk to TTK widgets!
     sv_ttk.set_theme("dark")
     app = FashionAssistantGUI(
-        root, long_term_retrieval=not args.disable_long_term_retrieval
+        root,
+        long_term_retrieval=not args.disable_long_term_retrieval,
+        response_cache=args.response_cache,
+        candidates=args.candidates,
+    )
+    root.after_idle(
+        lambda: logging.getLogger(__name__).info(
+            "Window shown after %.2fs", time.perf_counter() - startup_time
+        )
     )
     root.mainloop()
@@ -1,7 +1,11 @@
 from src.agent.controller.controller import Controller
 from src.agent.asr.asr import ASR
+from src.agent.memory.retrieval import check_ollama
 
 def main():
+    if not check_ollama():
+        return
+
     asr_instance = ASR(model_name="base")
     controller = Controller(asr=asr_instance)
 
@@ -1,5 +1,8 @@
-import whisper
+import threading
 import warnings
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+import numpy as np
 
 warnings.filterwarnings(
     "ignore", message="FP16 is not supported on CPU; using FP32 instead"
@@ -8,21 +11,129 @@ warnings.filterwarnings(
 
 class ASR:
     def __init__(self, model_name: str = "base"):
+        import whisper  # imported here, since it pulls in torch which is slow to import
+
         self.model = whisper.load_model(model_name)
 
     def transcribe(
-        self, prompt: str, audio: str
+        self, prompt: str, audio: str | np.ndarray
     ) -> (
         str
-    ):  # transciption function, taking the audio file and the initial prompt as input
+    ):  # transciption function, taking the audio (a file or a 16 kHz buffer) and the initial prompt as input
+        if isinstance(audio, np.ndarray):
+            audio = to_whisper_input(audio)
         result = self.model.transcribe(audio, initial_prompt=prompt)
         return result.get("text", "")
 
+    def transcribe_stream(
+        self,
+        prompt: str,
+        blocks: Iterable[np.ndarray],
+        on_partial: Callable[[str], None] = None,
+        interval: float = 0.5,
+        sample_rate: int = 16000,
+    ) -> str:
+        """
+        Transcribe audio while it is still being recorded.
+
+        Whenever `interval` seconds of new audio have arrived, the not yet committed part of
+        the recording is transcribed on a worker thread and the hypothesis is passed to
+        `on_partial`. A pass takes the latest audio, audio that arrived during the previous
+        pass is not transcribed separately, so reading the blocks never waits for Whisper.
+        Segments that end well before the live edge are committed, so the final pass after
+        the last block only has to cover the uncommitted tail of the utterance.
+        """
+        chunks = []
+        received = 0  # samples received so far
+        last_pass = 0
+        state = _StreamState()
+        worker = threading.Thread(
+            target=self._partial_passes,
+            args=(prompt, state, on_partial, sample_rate),
+            daemon=True,
+        )
+        worker.start()
+
+        try:
+            for block in blocks:
+                chunks.append(to_whisper_input(block))
+                received += len(chunks[-1])
+                if received - last_pass < interval * sample_rate:
+                    continue
+                last_pass = received
+                with state.changed:
+                    state.pending = np.concatenate(chunks)  # replaces a stale request
+                    state.changed.notify()
+        finally:
+            with state.changed:
+                state.finished = True
+                state.changed.notify()
+            worker.join()  # waits for a pass in progress, its commits are kept
+
+        # Endpoint reached, finalize with one last pass over the uncommitted audio
+        audio = np.concatenate(chunks) if chunks else np.zeros(0, np.float32)
+        committed = state.committed
+        if len(audio) > state.commit_point:
+            result = self.model.transcribe(
+                audio[state.commit_point :],
+                initial_prompt=f"{prompt} {committed}".strip(),
+            )
+            committed += result.get("text", "")
+        return committed.strip()
+
+    def _partial_passes(self, prompt, state, on_partial, sample_rate):
+        """Worker of `transcribe_stream`, transcribes the latest audio until finished"""
+        while True:
+            with state.changed:
+                state.changed.wait_for(lambda: state.pending is not None or state.finished)
+                if state.finished:
+                    return
+                audio, state.pending = state.pending, None
+
+            start = state.commit_point
+            result = self.model.transcribe(
+                audio[start:], initial_prompt=f"{prompt} {state.committed}".strip()
+            )
+            segments = result.get("segments", [])
+
+            # Segments that ended more than a second ago will not change anymore
+            # (segment times are relative to the start of the transcribed audio)
+            stable_until = (len(audio) - start) / sample_rate - 1.0
+            while len(segments) > 1 and segments[0]["end"] < stable_until:
+                segment = segments.pop(0)
+                state.committed += segment["text"]
+                state.commit_point = start + int(segment["end"] * sample_rate)
+
+            if on_partial is not None:
+                on_partial(
+                    (state.committed + "".join(s["text"] for s in segments)).strip()
+                )
+
+
+@dataclass
+class _StreamState:
+    """Shared between the block loop of `transcribe_stream` and its worker"""
+
+    committed: str = ""  # text of the audio before `commit_point`
+    commit_point: int = 0
+    pending: np.ndarray | None = None  # latest audio not yet transcribed
+    finished: bool = False
+    changed: threading.Condition = field(default_factory=threading.Condition)
+
+
+def to_whisper_input(audio: np.ndarray) -> np.ndarray:
+    """Convert a recording to the mono float32 array in [-1, 1] that Whisper decodes from"""
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if np.issubdtype(audio.dtype, np.integer):
+        audio = audio / np.iinfo(audio.dtype).max
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
 
 """
 example use case:
 asr_instance = ASR(model_name="base")
 
-text = asr_instance.transcribe("test.mp3")
+text = asr_instance.transcribe("", "test.mp3")
 print("Transcribed text:", text)
 """
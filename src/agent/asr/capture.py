@@ -0,0 +1,221 @@
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterator
+import numpy as np
+import sounddevice as sd
+
+SAMPLE_RATE = 16000  # what Whisper expects
+BLOCK_DURATION = 0.03  # seconds of audio per VAD decision
+PRE_ONSET = 0.2  # seconds kept before speech onset, so the first syllable is not cut off
+PRE_ROLL = 0.3  # seconds of audio before the start of a recording that are included
+BARGE_IN_THRESHOLD = 0.05  # speech level needed to interrupt the assistant, above its echo
+
+
+@dataclass(frozen=True)
+class Endpointing:
+    """When to start and stop capturing an utterance"""
+
+    max_duration: float = 10.0  # hard limit on the length of an utterance
+    trailing_silence: float = 0.8  # silence after speech that ends the utterance
+    onset_timeout: float = 8.0  # how long to wait for the user to start speaking
+    min_speech: float = 0.09  # consecutive speech needed to count as an onset
+    threshold: float = 0.01  # minimum RMS level of speech
+    onset_threshold: float | None = None  # higher level required to start, if set
+
+
+# Presets for the questions the assistant asks
+SHORT_ANSWER = Endpointing(max_duration=4.0, trailing_silence=0.5)
+LONG_ANSWER = Endpointing(max_duration=20.0, trailing_silence=1.2)
+
+
+class VoiceActivityDetector:
+    """
+    Energy based voice activity detection over fixed-size blocks.
+
+    A block counts as speech if its RMS level is above both the fixed threshold and a
+    multiple of the running noise floor, which is estimated from the non-speech blocks.
+    """
+
+    NOISE_FACTOR = 3.0
+
+    def __init__(self, endpointing: Endpointing, sample_rate: int = SAMPLE_RATE):
+        self.endpointing = endpointing
+        self.block_size = int(BLOCK_DURATION * sample_rate)
+        self.noise_floor = None
+
+        self.blocks = 0  # blocks processed so far
+        self.onset = None  # block index where speech started
+        self.speech_run = 0
+        self.silence_run = 0
+
+    @property
+    def started(self) -> bool:
+        return self.onset is not None
+
+    def is_speech(self, block: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(np.square(block, dtype=np.float32))))
+        threshold = self.endpointing.threshold
+        if not self.started and self.endpointing.onset_threshold is not None:
+            threshold = self.endpointing.onset_threshold
+        if self.noise_floor is not None:
+            threshold = max(threshold, self.NOISE_FACTOR * self.noise_floor)
+        speech = rms > threshold
+        if not speech:
+            # Slowly track the background noise
+            if self.noise_floor is None:
+                self.noise_floor = rms
+            else:
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return speech
+
+    def process(self, block: np.ndarray) -> bool:
+        """Feed one block of audio, returns True once the utterance has ended"""
+        self.blocks += 1
+        speech = self.is_speech(block)
+        self.speech_run = self.speech_run + 1 if speech else 0
+        self.silence_run = 0 if speech else self.silence_run + 1
+
+        elapsed = self.blocks * BLOCK_DURATION
+        if not self.started:
+            if self.speech_run * BLOCK_DURATION >= self.endpointing.min_speech:
+                self.onset = self.blocks - self.speech_run
+                return False
+            return elapsed >= self.endpointing.onset_timeout
+
+        speech_duration = (self.blocks - self.onset) * BLOCK_DURATION
+        return (
+            self.silence_run * BLOCK_DURATION >= self.endpointing.trailing_silence
+            or speech_duration >= self.endpointing.max_duration
+        )
+
+
+class CaptureService:
+    """
+    Keeps the microphone open and records into a fixed-size ring buffer.
+
+    Utterances are read from the ring buffer, so they can start with audio captured before
+    they were requested (the pre-roll) and no device has to be opened per utterance. The
+    stream is opened on first use, or explicitly with `start`.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, buffer_duration: float = 30.0):
+        self.sample_rate = sample_rate
+        self.block_size = int(BLOCK_DURATION * sample_rate)
+        self._ring = np.zeros(int(buffer_duration * sample_rate), np.float32)
+        self._written = 0  # total number of samples written to the ring buffer
+        self._new_audio = threading.Event()
+        self._stream = None
+        self._closed = False  # set by `close`, no more audio is captured after it
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._stream is not None or self._closed:
+                return
+            self._stream = sd.InputStream(
+                samplerate=self.sample_rate,
+                channels=1,
+                dtype="float32",
+                blocksize=self.block_size,
+                callback=self._callback,
+            )
+            self._stream.start()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            if self._stream is not None:
+                self._stream.stop()
+                self._stream.close()
+                self._stream = None
+        self._new_audio.set()  # wake up the consumers, they stop
+
+    def _callback(self, indata, frames, time, status):
+        # Runs on the audio thread: copy into the preallocated ring buffer, no allocations
+        size = len(self._ring)
+        start = self._written % size
+        first = min(frames, size - start)
+        self._ring[start : start + first] = indata[:first, 0]
+        self._ring[: frames - first] = indata[first:, 0]
+        self._written += frames
+        self._new_audio.set()
+
+    def _read(self, position: int, frames: int) -> np.ndarray:
+        """Copy `frames` samples starting at absolute sample `position` out of the ring"""
+        indices = np.arange(position, position + frames) % len(self._ring)
+        return self._ring[indices]
+
+    def _wait_for(self, position: int) -> bool:
+        """
+        Block until the ring buffer holds a full block after `position`. False if no more
+        audio will arrive, because the service was closed or the stream stopped.
+        """
+        while self._written - position < self.block_size:
+            if self._closed:
+                return False
+            self._new_audio.clear()
+            if self._written - position >= self.block_size:
+                break
+            if not self._new_audio.wait(timeout=0.5) and not self._active():
+                return False
+        return True
+
+    def _active(self) -> bool:
+        stream = self._stream
+        return stream is not None and stream.active
+
+    def utterance_blocks(
+        self,
+        endpointing: Endpointing = Endpointing(),
+        pre_roll: float = PRE_ROLL,
+        on_onset: Callable[[], None] = None,
+        cancel: threading.Event = None,
+    ) -> Iterator[np.ndarray]:
+        """
+        Capture an utterance until the user stops talking, yielding the audio live.
+
+        Listening starts `pre_roll` seconds before the call. Nothing is yielded until speech
+        onset, then the mono float32 blocks from just before the onset up to the endpoint.
+        Yields nothing if the user did not start speaking within the onset timeout, or
+        before `cancel` was set. Ends early once the service is closed. `on_onset` is called as soon as speech starts, before the
+        first block is yielded.
+        """
+        self.start()
+        vad = VoiceActivityDetector(endpointing, self.sample_rate)
+        kept = max(PRE_ONSET, pre_roll) + endpointing.min_speech
+        pre_onset = deque(maxlen=int(kept / BLOCK_DURATION) + 1)
+        position = max(0, self._written - int(pre_roll * self.sample_rate))
+
+        while True:
+            if cancel is not None and cancel.is_set() and not vad.started:
+                return
+            if not self._wait_for(position):
+                return
+            if self._written - position > len(self._ring) - self.block_size:
+                # Fell behind by more than the ring buffer holds, skip the lost audio
+                position = self._written - self.block_size
+            block = self._read(position, self.block_size)
+            position += self.block_size
+
+            started = vad.started
+            ended = vad.process(block)
+            if started:
+                yield block
+            elif vad.started:
+                # Speech onset, release the blocks leading up to it
+                if on_onset is not None:
+                    on_onset()
+                yield from pre_onset
+                yield block
+            else:
+                pre_onset.append(block)
+            if ended:
+                return
+
+    def record_utterance(
+        self, endpointing: Endpointing = Endpointing(), pre_roll: float = PRE_ROLL
+    ) -> np.ndarray:
+        """Record a complete utterance, see `utterance_blocks`. Empty if there was no speech."""
+        blocks = list(self.utterance_blocks(endpointing, pre_roll))
+        return np.concatenate(blocks) if blocks else np.zeros(0, np.float32)
@@ -3,12 +3,14 @@ from enum import Enum
 from src.agent.memory.memory import Memory
 from src.agent.emotion.linguistic import LinguisticSystem
 from src.agent.asr.asr import ASR
-from time import sleep
+from src.agent.asr.capture import (
+    CaptureService,
+    Endpointing,
+    LONG_ANSWER,
+    SHORT_ANSWER,
+)
 from src.agent.generator.generator import Generator
-import sounddevice as sd
-import wavio
-import uuid
-import os
+from src.agent.generator.outfit import Outfit
 from ..memory.schema import Context, User, Preference
 import re
 
@@ -31,6 +33,85 @@ def extract_name(text: str) -> str:
     return ""
 
 
+ORDINALS = ["first", "second", "third", "fourth", "fifth"]
+NUMBERS = ["one", "two", "three", "four", "five"]
+# "none of them" rejects every option, "not the second" only the option it precedes
+REJECTIONS = {"none", "neither", "nothing"}
+NEGATIONS = {"no", "not", "dont", "nor", "never"}
+# Words that may follow a bare number, as in "two please"
+FILLERS = {"please", "thanks", "thank", "you", "i", "think", "guess"}
+# Words before "one" that do not make it a number, as in "that one"
+DETERMINERS = {"a", "any", "each", "every", "that", "the", "this", "which"}
+
+
+def parse_choice(text: str, n: int) -> int | None:
+    """
+    Extracts which of `n` options was chosen, from answers like "option 2", "the second"
+    or just "two". A negation before an option in the same clause, like "not the second
+    one", skips that option, while "none of them" before any option chooses nothing.
+    Numbers that count something, as in "2 of them", are not choices.
+
+    Returns:
+        int | None: The index of the option, or None if none was chosen.
+    """
+    text = re.sub(r"n[’']t\b", " not", text.lower())
+    words = re.findall(r"\w+|[.,;:!?]", text)
+    negated = False
+    for i, word in enumerate(words):
+        if not word[0].isalnum():
+            negated = False  # a new clause
+        elif word in REJECTIONS:
+            return None
+        elif word in NEGATIONS:
+            negated = True
+        else:
+            choice = _option(words, i, n)
+            if choice is not None and not negated:
+                return choice
+    return None
+
+
+def _option(words: list[str], i: int, n: int) -> int | None:
+    """The option that `words[i]` refers to, if any"""
+    word = words[i]
+    if word in ORDINALS[:n]:
+        return ORDINALS.index(word)
+    if word.isdigit() and 1 <= int(word) <= n:
+        choice = int(word) - 1
+    elif word in NUMBERS[:n]:
+        choice = NUMBERS.index(word)
+    else:
+        return None
+    if i > 0 and words[i - 1] in ("option", "number"):
+        return choice
+    if i > 0 and words[i - 1] in DETERMINERS:
+        return None  # "that one"
+    # A bare number, unless more than filler follows it in its clause, as in "2 colours"
+    for following in words[i + 1 :]:
+        if not following[0].isalnum():
+            break
+        if following not in FILLERS:
+            return None
+    return choice
+
+
+# Prompts that are spoken in every conversation, the TTS engine renders them in advance
+FIXED_PROMPTS = (
+    "Hi! I'm an AI fashion assistant. What's your name?",
+    "What gender best describes your clothing preferences?",
+    "What is your height?",
+    "What is your body type?",
+    "Thank you for providing this information, I will remember it.",
+    "What's the occasion today?",
+    "And what's the weather like?",
+    "What style are you looking for?",
+    "Here is a recommendation for you.",
+    "What do you think?",
+    "Are you satisfied with the recommendation?",
+    "Thank you for using our service. Have a nice day!",
+)
+
+
 class ConversationPhase(Enum):
     ASK_NAME = "ask_name"
     ASK_CONTEXT = "ask_context"
@@ -45,6 +126,9 @@ class Controller:
     emotion: LinguisticSystem = field(default_factory=LinguisticSystem)
     asr: ASR = field(default_factory=ASR)
     generator: Generator = field(default_factory=Generator)
+    capture: CaptureService = field(default_factory=CaptureService)
+    # Number of outfits proposed at once, more than one lets the user pick between them
+    candidates: int = 1
 
     user: str = ""
     user_attributes: dict = None
@@ -56,7 +140,6 @@ class Controller:
     def start(self):
         while not self.phase == ConversationPhase.END:
             self.step()
-            sleep(0.1)
 
     def step(self) -> str:
         match self.phase:
@@ -69,18 +152,21 @@ class Controller:
 
     def handle_ask_name(self) -> ConversationPhase:
         # Assume that it will be allways the same user
-        users = self.memory.list_users()
-        if len(users) > 0:
-            self.user = users[0]["name"]
+        names = self.memory.list_user_names()
+        if len(names) > 0:
+            # Only this user's history is loaded
+            user = self.memory.get_user(names[0])
+            self.user = user["name"]
             self.user_attributes = {
-                k: v for k, v in users[0].items() if k not in ["conversations", "name"]
+                k: v for k, v in user.items() if k not in ["conversations", "name"]
             }
             self.speak(f"Welcome back {self.user}!")
             return ConversationPhase.ASK_CONTEXT
 
         self.speak("Hi! I'm an AI fashion assistant. What's your name?")
         response, _ = self.listen(
-            prompt="Hi! I'm an AI fashion assistant. What's your name?"
+            prompt="Hi! I'm an AI fashion assistant. What's your name?",
+            endpointing=SHORT_ANSWER,
         )
         self.user = response
 
@@ -90,14 +176,19 @@ class Controller:
 
         self.speak("What gender best describes your clothing preferences?")
         gender, _ = self.listen(
-            prompt="What gender best describes your clothing preferences?"
+            prompt="What gender best describes your clothing preferences?",
+            endpointing=SHORT_ANSWER,
         )
 
         self.speak("What is your height?")
-        height, _ = self.listen(prompt="What is your height?")
+        height, _ = self.listen(
+            prompt="What is your height?", endpointing=SHORT_ANSWER
+        )
 
         self.speak("What is your body type?")
-        body_type, _ = self.listen(prompt="What is your body type?")
+        body_type, _ = self.listen(
+            prompt="What is your body type?", endpointing=SHORT_ANSWER
+        )
 
         user = dict(
             name=self.user,
@@ -121,10 +212,14 @@ class Controller:
         occasion, _ = self.listen(prompt="What's the occasion today?")
 
         self.speak("And what's the weather like?")
-        weather, _ = self.listen(prompt="And what's the weather like?")
+        weather, _ = self.listen(
+            prompt="And what's the weather like?", endpointing=SHORT_ANSWER
+        )
 
         self.speak("What style are you looking for?")
-        style, _ = self.listen(prompt="What style are you looking for?")
+        style, _ = self.listen(
+            prompt="What style are you looking for?", endpointing=LONG_ANSWER
+        )
 
         context = dict(occasion=occasion, weather=weather, style=style)
 
@@ -133,24 +228,37 @@ class Controller:
         return ConversationPhase.RECOMMENDING
 
     def handle_recommending(self) -> ConversationPhase:
+        if self.candidates > 1:
+            return self.handle_recommending_candidates()
+
         self.speak("Here is a recommendation for you.")
         memories = self.memory.retrieve(self.user, self.conversation_index)
-        text, image = self.generator.generate(
-            self.context, self.user_attributes, memories
+        outfit = self.generator.generate_outfit(
+            self.context, self.user_attributes, memories, []
         )
-        self.speak(text)
-        self.show_image(image)
+        # The image is fetched while the recommendation is spoken
+        image = self.generator.generate_image_async(outfit)
+        self.speak(outfit.description)
+        self.speak(outfit.summary)
+        self.show_image(image.result())
 
         self.speak("What do you think?")
-        response, emotion = self.listen(prompt="What do you think?")
+        response, emotion = self.listen(
+            prompt="What do you think?", endpointing=LONG_ANSWER
+        )
 
-        preference = dict(outfit=text, response=response, emotion=emotion)
+        preference = dict(outfit=outfit.memory_key, response=response, emotion=emotion)
         self.memory.add_preference(
             self.user, self.conversation_index, preference
         )  # storage of emotion into memory
 
         self.speak("Are you satisfied with the recommendation?")
-        response, _ = self.listen(prompt="Are you satisfied with the recommendation?")
+        response, _ = self.listen(
+            prompt="Are you satisfied with the recommendation?",
+            endpointing=SHORT_ANSWER,
+        )
+        # persist this turn's preferences in one transaction, in the background
+        self.memory.flush_async()
 
         if "yes" in response.lower():
             self.speak("Thank you for using our service. Have a nice day!")
@@ -158,25 +266,66 @@ class Controller:
         else:
             return ConversationPhase.RECOMMENDING
 
+    def handle_recommending_candidates(self) -> ConversationPhase:
+        self.speak("Here are some recommendations for you.")
+        memories = self.memory.retrieve(self.user, self.conversation_index)
+        # One completion for all outfits, their images are fetched concurrently
+        outfits = self.generator.generate_candidates(
+            self.context, self.user_attributes, memories, [], n=self.candidates
+        )
+        images = [self.generator.generate_image_async(outfit) for outfit in outfits]
+        for i, (outfit, image) in enumerate(zip(outfits, images)):
+            self.speak(f"Option {i + 1}: {outfit.summary}")
+            self.show_image(image.result())
+
+        self.speak("Which one do you like best?")
+        response, emotion = self.listen(
+            prompt="Which one do you like best?", endpointing=LONG_ANSWER
+        )
+        choice = parse_choice(response, len(outfits))
+        self.add_candidate_preferences(outfits, choice, response, emotion)
+        self.memory.flush_async()
+
+        if choice is None:
+            return ConversationPhase.RECOMMENDING
+        self.speak("Thank you for using our service. Have a nice day!")
+        return ConversationPhase.ASK_NAME
+
+    def add_candidate_preferences(
+        self, outfits: list[Outfit], choice: int | None, response: str, emotion: str
+    ) -> None:
+        """Store the verdict on every proposed outfit, both the chosen and the rejected ones"""
+        alternatives = len(outfits) - 1
+        for i, outfit in enumerate(outfits):
+            if choice is None:
+                verdict = f"rejected it along with {alternatives} alternatives, {response}"
+            elif i == choice:
+                verdict = f"picked it over {alternatives} alternatives, {response}"
+            else:
+                verdict = f"preferred option {choice + 1} over it"
+            preference = dict(
+                outfit=outfit.memory_key,
+                response=verdict,
+                emotion=emotion if choice in (None, i) else "neutral",
+            )
+            self.memory.add_preference(self.user, self.conversation_index, preference)
+
     def show_image(self, image):
         image.show()
 
     def speak(self, message: str):
         print(message)
 
-    def listen(self, prompt: str) -> tuple[str, str]:
-        duration = 5
-        fs = 16000
-        print("Listening... Please speak now.")  # listen to the user for 5 seconds
-        recording = sd.rec(int(duration * fs), samplerate=fs, channels=1)
-        sd.wait()
-        temp_filename = f"temp/{uuid.uuid4()}.wav"
-        wavio.write(temp_filename, recording, fs, sampwidth=2)
-
-        text = self.asr.transcribe(prompt, temp_filename)  # transcribe text
+    def listen(
+        self, prompt: str, endpointing: Endpointing = Endpointing()
+    ) -> tuple[str, str]:
+        print("Listening... Please speak now.")  # listen until the user stops talking
+        # transcribe text while the user is speaking, finalized once they stop
+        text = self.asr.transcribe_stream(
+            prompt, self.capture.utterance_blocks(endpointing)
+        )
+        if not text:
+            return "", "neutral"
         emotion = self.emotion.get_emotion(text)  # infer emotion from the text
 
-        # Clean up the temporary file.
-        os.remove(temp_filename)
-
         return text, "neutral"
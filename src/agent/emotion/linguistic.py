@@ -1,8 +1,8 @@
 
-from transformers import pipeline
-
 class LinguisticSystem:
     def __init__(self):
+        from transformers import pipeline  # slow to import, so only when the model is loaded
+
         self.emotion = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base") #feed the text to the classifier to infer emotion
 
 
@@ -0,0 +1,228 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+import numpy as np
+
+
+class ImageCache:
+    """
+    Cache of generated images, keyed on a hash of the normalized image prompt and the
+    generation parameters.
+
+    The downloaded bytes are stored as they are, without re-encoding, and are written on a
+    background thread. The directory is bounded in size and number of files, evicting the
+    least recently used images first.
+    """
+
+    def __init__(self, cache_dir, max_bytes=200 * 2**20, max_entries=500):
+        """
+        Args:
+            cache_dir (str): Directory for the image files
+            max_bytes (int): Maximum total size of the images
+            max_entries (int): Maximum number of images
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(prompt, **params):
+        normalized = " ".join(prompt.lower().split())
+        options = "&".join(f"{name}={params[name]}" for name in sorted(params))
+        payload = f"{normalized}\0{options}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, key):
+        """Contents of the cached image, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put_async(self, key, data) -> Future:
+        """Store an image in the background"""
+        return self._writer.submit(self._put, key, data)
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+        )
+
+    def close(self):
+        self._writer.shutdown(wait=True)  # finish the pending writes
+
+    def _put(self, key, data):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.img")
+
+    def _evict(self):
+        """Remove the least recently used images until both limits are met"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".img"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes and count <= self.max_entries:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                count -= 1
+            except OSError:
+                pass
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    key: str
+    embedding: np.ndarray  # unit-normalized embedding of the context
+    text: str
+    latency: float  # seconds the generation took
+    created: float
+
+
+class ResponseCache:
+    """
+    Opt-in cache of generated outfit texts, for requests that are effectively the same.
+
+    The user attributes, retrieved memories and previous suggestions have to match exactly,
+    the context only has to be similar: a request hits an entry if the cosine similarity of
+    the context embeddings is at least `threshold`. Entries expire after `ttl` seconds and
+    the least recently used entries are evicted beyond `max_entries`. Images are cached by
+    their prompt, so the image of a cached text is found in the ImageCache as well.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[object], np.ndarray],
+        threshold: float = 0.95,
+        ttl: float = 3600.0,
+        max_entries: int = 256,
+    ):
+        """
+        Args:
+            embed (callable): Computes the embedding of a context
+            threshold (float): Minimum cosine similarity of the contexts for a hit
+            ttl (float): Seconds an entry stays valid
+            max_entries (int): Maximum number of entries
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[int, CachedResponse] = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0  # generation time of the responses that were reused
+
+    @staticmethod
+    def key(user_attributes, memories, previous_suggestions):
+        payload = json.dumps(
+            [user_attributes, memories, previous_suggestions], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, user_attributes, context, memories, previous_suggestions):
+        """The cached text of a matching request, or None on a miss"""
+        key = self.key(user_attributes, memories, previous_suggestions)
+        embedding = self._embed(context)
+        if embedding is None:
+            return None
+
+        with self._lock:
+            now = time.monotonic()
+            best, best_similarity = None, self.threshold
+            for entry_id, entry in list(self._entries.items()):
+                if now - entry.created > self.ttl:
+                    del self._entries[entry_id]
+                    continue
+                if entry.key != key:
+                    continue
+                similarity = float(entry.embedding @ embedding)
+                if similarity >= best_similarity:
+                    best, best_similarity = entry_id, similarity
+
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            entry = self._entries[best]
+            self.hits += 1
+            self.saved_seconds += entry.latency
+            return entry.text
+
+    def put(self, user_attributes, context, memories, previous_suggestions, text, latency):
+        embedding = self._embed(context)
+        if embedding is None:
+            return
+        entry = CachedResponse(
+            key=self.key(user_attributes, memories, previous_suggestions),
+            embedding=embedding,
+            text=text,
+            latency=latency,
+            created=time.monotonic(),
+        )
+        with self._lock:
+            self._entries[next(self._ids)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+            saved_seconds=self.saved_seconds,
+            entries=len(self._entries),
+        )
+
+    def _embed(self, context):
+        try:
+            embedding = np.asarray(self.embed(context), np.float32)
+        except Exception as e:
+            # Without an embedding the request is simply not cached
+            print(f"Failed to embed context for the response cache: {e}")
+            return None
+        return embedding / np.linalg.norm(embedding)
@@ -1,19 +1,63 @@
+import json
 import random
-import string
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+from urllib.parse import quote
 
-import requests
-from mistralai import Mistral
 from PIL import Image
 from io import BytesIO
 import os
+from .cache import ImageCache, ResponseCache
+from .image_client import ImageClient, ImageFetchError
+from .outfit import OUTFIT_PROMPT, Outfit, parse_outfit
+from .prompt import build_prompt, estimate_tokens
+from .router import ModelRouter, RoutingDecision
+
+
+IMAGE_PARAMS = dict(width=384, height=512, model="flux")
+CANDIDATES_PROMPT = """
+Create {n} distinct outfits, each with the fields described above. Answer in JSON of the form {{"outfits": [{{<fields of outfit 1>}}, {{<fields of outfit 2>}}, ...]}}.
+"""
+
+
+def parse_candidates(content: str) -> list[Outfit]:
+    """The outfits of a JSON answer to CANDIDATES_PROMPT, or the whole answer as one outfit"""
+    try:
+        outfits = json.loads(content)["outfits"]
+    except (ValueError, TypeError, KeyError):
+        return [parse_outfit(content)]
+    candidates = []
+    for outfit in outfits if isinstance(outfits, list) else []:
+        if isinstance(outfit, dict):
+            candidates.append(Outfit.from_fields(outfit))
+        elif isinstance(outfit, str) and outfit.strip():  # free text instead of fields
+            candidates.append(Outfit.from_text(outfit))
+    return candidates or [parse_outfit(content)]
 
 
 class Generator:
-    def __init__(self):
+    def __init__(
+        self, server_url: str = None, response_cache: ResponseCache | None = None
+    ):
+        from mistralai import Mistral  # slow to import, so only when a generator is created
+
         # key_file_path = os.path.join(os.path.dirname(__file__), "mistral_api")
-        self.mistral_client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
-        self.model = "mistral-large-latest"
+        self.mistral_client = Mistral(
+            api_key=os.getenv("MISTRAL_API_KEY"), server_url=server_url
+        )
+        # Large model for first recommendations, a smaller one for refinements
+        self.router = ModelRouter()
+        self.last_route = None  # routing decision of the last completion
+        self.last_ttft = None  # seconds until the first streamed token arrived
+        self.prompt_budget = 1500  # estimated tokens, see `build_prompt`
+        self.last_prompt_tokens = None  # estimated size of the last prompt
+        # Optional, reuses the text generated for effectively the same request
+        self.response_cache = response_cache
+        # Images are fetched in the background, while the recommendation is spoken,
+        # the images of several candidates are fetched concurrently
+        self.image_pool = ThreadPoolExecutor(max_workers=3)
+        self.image_client = ImageClient()
         self.initialisation_prompt = """You are a fashion outfit generator. Based on the provided CONTEXT (occasion), your Previous Suggestions (so that you know what was suggested in the conversation) and PREFERENCES (the preferences of the person regarding clothing), create an outfit with this structure:
         1. Top: Upper garments (color, material, style)
         2. Bottom: Lower garments (color, material, style)
@@ -23,12 +67,11 @@ class Generator:
 
         Be specific with colors and materials for image generation.
 
-        Provide me a short summary of the outfit you create so that I can use the text to speech model to describe the outfit. Add it a the end and start with Summary:
-        """
-        # Create a cache directory if it doesn't exist
+        Provide me a short summary of the outfit you create so that I can use the text to speech model to describe the outfit.
+        """ + OUTFIT_PROMPT
+        # Downloaded images, reused when the same outfit is shown again
         self.cache_dir = os.path.join(os.path.dirname(__file__), "image_cache")
-        if not os.path.exists(self.cache_dir):
-            os.makedirs(self.cache_dir)
+        self.image_cache = ImageCache(self.cache_dir)
 
     def generate(
         self,
@@ -39,11 +82,43 @@ class Generator:
     ):
         if previous_suggestions_text is None:
             previous_suggestions_text = []
-        text = self.generate_text(
+        outfit = self.generate_outfit(
             context, user_attributes, memories, previous_suggestions_text
         )
-        image = self.generate_image(text)
-        return text, image
+        image = self.generate_image(outfit)
+        return outfit, image
+
+    def build_prompt(
+        self,
+        context: str,
+        user_attributes: dict,
+        memories: list[str],
+        previous_suggestions_text: list[str],
+    ) -> str:
+        # Older suggestions and low ranked memories are compacted to fit the budget
+        prompt = build_prompt(
+            self.initialisation_prompt,
+            user_attributes,
+            context,
+            memories,
+            previous_suggestions_text,
+            budget=self.prompt_budget,
+        )
+        self.last_prompt_tokens = estimate_tokens(prompt)
+        return prompt
+
+    def generate_outfit(
+        self,
+        context: str,
+        user_attributes: dict,
+        memories: list[str],
+        previous_suggestions_text: list[str],
+    ) -> Outfit:
+        return parse_outfit(
+            self.generate_text(
+                context, user_attributes, memories, previous_suggestions_text
+            )
+        )
 
     def generate_text(
         self,
@@ -52,67 +127,225 @@ class Generator:
         memories: list[str],
         previous_suggestions_text: list[str],
     ) -> str:
-        # Construct the prompt using the initialization prompt, context and memories
-        prompt = f"{self.initialisation_prompt}\n\nUSER: {user_attributes}\nCONTEXT: {context}\n\n"
-
-        if memories:
-            prompt += "PREFERENCES:\n"
-            for i, memory in enumerate(memories):
-                prompt += f"{i + 1}. {memory}\n"
-        if previous_suggestions_text:
-            prompt += "PREVIOUS SUGGESTIONS:\n"
-            for i, suggestion in enumerate(previous_suggestions_text):
-                prompt += f"{i + 1}. {suggestion}\n"
-
-        # Generate text using Mistral API
-        chat_response = self.mistral_client.chat.complete(
-            model=self.model,
+        """The JSON answer of the model, see `generate_outfit` for the parsed outfit"""
+        cached = self._cached_text(
+            context, user_attributes, memories, previous_suggestions_text
+        )
+        if cached is not None:
+            return cached
+
+        prompt = self.build_prompt(
+            context, user_attributes, memories, previous_suggestions_text
+        )
+
+        start = time.perf_counter()
+        text = self._complete(
+            prompt, previous_suggestions_text, response_format={"type": "json_object"}
+        )
+        self._cache_text(
+            context, user_attributes, memories, previous_suggestions_text,
+            text, time.perf_counter() - start,
+        )
+        return text
+
+    def generate_candidates(
+        self,
+        context: str,
+        user_attributes: dict,
+        memories: list[str],
+        previous_suggestions_text: list[str],
+        n: int = 3,
+    ) -> list[Outfit]:
+        """
+        Generate `n` distinct outfits in a single completion. May return fewer if the
+        model does not comply.
+        """
+        prompt = self.build_prompt(
+            context, user_attributes, memories, previous_suggestions_text
+        )
+        prompt += CANDIDATES_PROMPT.format(n=n)
+        content = self._complete(
+            prompt,
+            previous_suggestions_text,
+            outfits=n,
+            response_format={"type": "json_object"},
+        )
+        return parse_candidates(content)[:n]
+
+    def _complete(
+        self, prompt: str, previous_suggestions: list[str], outfits: int = 1, **options
+    ) -> str:
+        """
+        Generate text using Mistral API, on the model picked by the router. The latency
+        budget is scaled by the number of `outfits` in the answer.
+        """
+        import httpx  # comes with mistralai
+
+        decision = self.router.route(previous_suggestions)
+        while True:
+            attempt_start = time.perf_counter()
+            try:
+                chat_response = self.mistral_client.chat.complete(
+                    model=decision.model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": prompt,
+                        },
+                    ],
+                    timeout_ms=self.router.timeout_ms(decision, outfits),
+                    **options,
+                )
+                break
+            except httpx.TimeoutException:
+                self.router.record_latency(
+                    decision.model, time.perf_counter() - attempt_start
+                )
+                decision = self.router.fallback(decision)
+                if decision is None:
+                    raise
+        self.router.record_latency(decision.model, time.perf_counter() - attempt_start)
+        self.last_route = decision
+        return chat_response.choices[0].message.content
+
+    def generate_text_stream(
+        self,
+        context: str,
+        user_attributes: dict,
+        memories: list[str],
+        previous_suggestions_text: list[str],
+    ) -> Iterator[str]:
+        """
+        Like `generate_text`, but yields the JSON answer piece by piece while it is
+        generated, see `OutfitStream` to display it while it arrives. `last_ttft` is set
+        to the time until the first piece arrived. The fallback to the small model is only
+        possible until then.
+        """
+        import httpx  # comes with mistralai
+
+        cached = self._cached_text(
+            context, user_attributes, memories, previous_suggestions_text
+        )
+        if cached is not None:
+            self.last_ttft = 0.0
+            yield cached
+            return
+
+        prompt = self.build_prompt(
+            context, user_attributes, memories, previous_suggestions_text
+        )
+
+        start = time.perf_counter()
+        self.last_ttft = None
+        pieces = []
+        decision = self.router.route(previous_suggestions_text)
+        while True:
+            attempt_start = time.perf_counter()
+            try:
+                for content in self._stream_completion(decision, prompt):
+                    if self.last_ttft is None:
+                        self.last_ttft = time.perf_counter() - start
+                    pieces.append(content)
+                    yield content
+                break
+            except httpx.TimeoutException:
+                self.router.record_latency(
+                    decision.model, time.perf_counter() - attempt_start
+                )
+                decision = None if pieces else self.router.fallback(decision)
+                if decision is None:
+                    raise
+        self.router.record_latency(decision.model, time.perf_counter() - attempt_start)
+        self.last_route = decision
+
+        self._cache_text(
+            context, user_attributes, memories, previous_suggestions_text,
+            "".join(pieces), time.perf_counter() - start,
+        )
+
+    def _stream_completion(self, decision: RoutingDecision, prompt: str) -> Iterator[str]:
+        stream = self.mistral_client.chat.stream(
+            model=decision.model,
             messages=[
                 {
                     "role": "user",
                     "content": prompt,
                 },
             ],
+            timeout_ms=self.router.timeout_ms(decision),
+            response_format={"type": "json_object"},
         )
+        with stream as events:
+            for event in events:
+                if not event.data.choices:
+                    continue
+                content = event.data.choices[0].delta.content
+                if isinstance(content, str) and content:
+                    yield content
 
-        return chat_response.choices[0].message.content
-
-    def generate_image(self, description: str) -> Image:
-        # Generate a unique request identifier using timestamp and random string
-        unique_id = f"{int(time.time())}_{self._random_string(6)}"
-
-        # URL encode the prompt
-        intro_prompt = "Show the outfit you generate on a manikin and only the manikin should be in the picture. The outfit consists of:\n"
-        image_prompt = f"{intro_prompt}{description}"
-
-        encoded_prompt = image_prompt.replace(" ", "%20")
+    def _cached_text(self, context, user_attributes, memories, previous_suggestions):
+        if self.response_cache is None:
+            return None
+        text = self.response_cache.get(
+            user_attributes, context, memories, previous_suggestions
+        )
+        if text is not None:
+            # No request was made
+            self.last_prompt_tokens = 0
+            self.last_route = None
+        return text
 
-        # Add a unique cache-busting parameter to avoid getting the same image
-        url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?width=384&height=512&model=flux&seed={unique_id}"
+    def _cache_text(
+        self, context, user_attributes, memories, previous_suggestions, text, latency
+    ):
+        if self.response_cache is not None and text:
+            self.response_cache.put(
+                user_attributes, context, memories, previous_suggestions, text, latency
+            )
 
-        # Create a unique filename for this request
-        cache_filename = os.path.join(self.cache_dir, f"outfit_{unique_id}.png")
+    def generate_image_async(self, outfit: Outfit, fresh: bool = False) -> Future:
+        """Fetch and decode the image in the background, returns a future of `generate_image`"""
+        return self.image_pool.submit(self.generate_image, outfit, fresh)
 
-        # Make the GET request
-        response = requests.get(url)
+    def generate_image(self, outfit: Outfit, fresh: bool = False) -> Image:
+        """
+        Generate an image of the outfit, or reuse the cached image of the same image prompt.
+        With `fresh`, the cache is bypassed and a new variation is generated.
+        """
+        # Only the compact image prompt, the URL stays short
+        intro_prompt = "Outfit on a manikin, only the manikin in the picture: "
+        image_prompt = f"{intro_prompt}{outfit.image_prompt}"
+        key = self.image_cache.key(image_prompt, **IMAGE_PARAMS)
 
-        # Check if the request was successful
-        if response.status_code == 200:
-            # Load the image from the response
-            image = Image.open(BytesIO(response.content))
+        content = None if fresh else self.image_cache.get(key)
+        cached = content is not None
+        if not cached:
+            # The seed decides the variation, it is fixed for a cacheable image
+            seed = random.randrange(2**31) if fresh else int(key[:8], 16)
+            encoded_prompt = quote(image_prompt, safe="")
+            options = "&".join(f"{name}={value}" for name, value in IMAGE_PARAMS.items())
+            url = f"https://image.pollinations.ai/prompt/{encoded_prompt}?{options}&seed={seed}"
 
-            # Save the image to the cache
-            image.save(cache_filename)
+            # Make the GET request, bounded in time and retried on failures
+            try:
+                content = self.image_client.get(url)
+            except ImageFetchError as e:
+                print(f"Failed to retrieve image. {e}")
+                return None
 
-            return image
-        else:
-            print(f"Failed to retrieve image. Status code: {response.status_code}")
+        # Load the image from the response, decoding it here rather than on the GUI thread
+        try:
+            image = Image.open(BytesIO(content))
+            image.load()
+        except OSError as e:  # not an image, e.g. an error page, or a truncated one
+            print(f"Failed to decode image. {e}")
             return None
 
-    def _random_string(self, length=6):
-        """Generate a random string to ensure uniqueness"""
-        chars = string.ascii_lowercase + string.digits
-        return "".join(random.choice(chars) for _ in range(length))
+        if not cached:
+            # The downloaded bytes are cached as they are, without re-encoding, once they
+            # are known to be an image
+            self.image_cache.put_async(key, content)
+        return image
 
 
 if __name__ == "__main__":
@@ -124,8 +357,8 @@ if __name__ == "__main__":
         "Dislikes formal suits",
     ]
 
-    text, image = generator.generate(context, memories, [])
-    print(f"Generated outfit:\n{text}")
+    outfit, image = generator.generate(context, {}, memories, [])
+    print(f"Generated outfit:\n{outfit.text}")
 
     if image:
         image.show()
@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying, the server is overloaded or temporarily unavailable
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class RequestTiming:
+    """How one image request went, over all of its attempts"""
+
+    status: int | None  # HTTP status of the last attempt, None if it did not get a response
+    attempts: int
+    first_byte: float | None  # seconds until the response headers of the last attempt
+    elapsed: float  # seconds in total, including retries and backoff
+    size: int  # bytes received
+    error: str | None = None
+
+
+class ImageClient:
+    """
+    HTTP client for the image generation backend.
+
+    Connections are reused through a pooled session. Every attempt is bounded by a connect
+    and a read timeout, failed attempts are retried with jittered exponential backoff, and
+    responses larger than `max_bytes` are rejected while they are being downloaded.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 60.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_bytes: int = 10 * 2**20,
+        pool_size: int = 4,
+    ):
+        """
+        Args:
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait for the server between bytes, image generation
+                itself happens before the first byte, so this also bounds generation
+            retries: How often a failed request is retried
+            backoff: Base delay in seconds, attempt n waits up to `backoff * 2**n`
+            max_bytes: Maximum size of a response
+            pool_size: Number of connections kept open
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_bytes = max_bytes
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.timings: deque[RequestTiming] = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> bytes:
+        """Download `url`, raises ImageFetchError once all attempts failed"""
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            status, first_byte, size = None, None, 0
+            try:
+                status, first_byte, data = self._get_once(url)
+                self._record(status, attempt + 1, first_byte, start, len(data))
+                return data
+            except _Retryable as e:
+                status, first_byte, error = e.status, e.first_byte, str(e)
+            except requests.RequestException as e:
+                # Also a connection that broke off or a body that could not be decoded
+                error = f"{type(e).__name__}: {e}"
+            except ImageFetchError as e:
+                self._record(None, attempt + 1, None, start, size, str(e))
+                raise
+
+            if attempt == self.retries:
+                self._record(status, attempt + 1, first_byte, start, size, error)
+                raise ImageFetchError(
+                    f"Giving up after {attempt + 1} attempts, last error: {error}"
+                )
+            # Full jitter, so clients that failed together do not retry together
+            time.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+    def _get_once(self, url: str) -> tuple[int, float, bytes]:
+        attempt_start = time.perf_counter()
+        with self.session.get(url, timeout=self.timeout, stream=True) as response:
+            first_byte = time.perf_counter() - attempt_start
+            if response.status_code in RETRY_STATUSES:
+                raise _Retryable(response.status_code, first_byte)
+            if response.status_code != 200:
+                raise ImageFetchError(f"Status code {response.status_code}")
+
+            length = response.headers.get("Content-Length")
+            if length is not None and int(length) > self.max_bytes:
+                raise ImageFetchError(f"Response of {length} bytes is too large")
+            chunks, size = [], 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ImageFetchError(f"Response exceeds {self.max_bytes} bytes")
+                chunks.append(chunk)
+        return response.status_code, first_byte, b"".join(chunks)
+
+    def _record(self, status, attempts, first_byte, start, size, error=None):
+        timing = RequestTiming(
+            status=status,
+            attempts=attempts,
+            first_byte=first_byte,
+            elapsed=time.perf_counter() - start,
+            size=size,
+            error=error,
+        )
+        with self._lock:
+            self.timings.append(timing)
+
+    @property
+    def stats(self) -> dict:
+        """Summary of the recent requests"""
+        with self._lock:
+            timings = list(self.timings)
+        elapsed = sorted(t.elapsed for t in timings)
+        return dict(
+            requests=len(timings),
+            failures=sum(t.error is not None for t in timings),
+            retries=sum(t.attempts - 1 for t in timings),
+            p50=elapsed[len(elapsed) // 2] if elapsed else None,
+            p95=elapsed[int(0.95 * (len(elapsed) - 1))] if elapsed else None,
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class _Retryable(Exception):
+    def __init__(self, status, first_byte):
+        super().__init__(f"Status code {status}")
+        self.status = status
+        self.first_byte = first_byte
@@ -0,0 +1,263 @@
+import json
+import re
+from dataclasses import dataclass
+
+from .prompt import SUMMARY_MARKER
+
+# Fields of the outfit description, in the order they are displayed, with their labels
+SECTIONS = (
+    ("top", "Top"),
+    ("bottom", "Bottom"),
+    ("footwear", "Footwear"),
+    ("accessories", "Accessories"),
+    ("suggestion", "Suggestions"),
+)
+OUTFIT_PROMPT = """
+Answer in JSON with the string fields, in this order: "top", "bottom", "footwear", "accessories", "suggestion" for the five sections, "summary" for the short summary, "image_prompt" for a compact visual description of the whole outfit for an image generator (at most 40 words) and "memory_key" for a short name of the outfit (at most 8 words, e.g. "white linen shirt with beige chinos").
+"""
+MAX_IMAGE_PROMPT_CHARS = 300
+MAX_MEMORY_KEY_WORDS = 8
+
+
+@dataclass(frozen=True)
+class Outfit:
+    top: str
+    bottom: str
+    footwear: str
+    accessories: str
+    suggestion: str
+    summary: str  # spoken to the user
+    image_prompt: str  # compact description for the image generator
+    memory_key: str  # short name, stored with the user's opinion of the outfit
+
+    @property
+    def description(self) -> str:
+        """The numbered sections, as shown to the user"""
+        return "\n".join(
+            f"{i + 1}. {label}: {getattr(self, name)}"
+            for i, (name, label) in enumerate(SECTIONS)
+        )
+
+    @property
+    def text(self) -> str:
+        """The description and summary, as given to the model as a previous suggestion"""
+        return f"{self.description}\n{SUMMARY_MARKER} {self.summary}"
+
+    @classmethod
+    def from_fields(cls, fields: dict) -> "Outfit":
+        """
+        Build an outfit from the fields of a JSON answer. Missing sections are left empty,
+        a missing image prompt or memory key is derived from the sections.
+        """
+        values = {
+            name: _clean(fields.get(name))
+            for name in ("summary", "image_prompt", "memory_key")
+        }
+        values.update((name, _clean(fields.get(name))) for name, _ in SECTIONS)
+        garments = [values[name] for name in ("top", "bottom", "footwear", "accessories")]
+        if not values["image_prompt"]:
+            values["image_prompt"] = _shorten(
+                ", ".join(g for g in garments if g), MAX_IMAGE_PROMPT_CHARS
+            )
+        if not values["memory_key"]:
+            values["memory_key"] = " with ".join(
+                " ".join(g.split(",")[0].split()[:MAX_MEMORY_KEY_WORDS // 2])
+                for g in garments[:2]
+                if g
+            )
+        if not values["summary"]:
+            values["summary"] = values["suggestion"]
+        return cls(**values)
+
+    @classmethod
+    def from_text(cls, text: str) -> "Outfit":
+        """Parse the numbered sections and summary of a free text answer"""
+        text = text.replace("**", "")
+        summary = ""
+        if SUMMARY_MARKER in text:
+            text, summary = text.split(SUMMARY_MARKER, 1)
+        labels = {label.lower(): name for name, label in SECTIONS}
+        labels["suggestion"] = "suggestion"
+        fields = {"summary": " ".join(summary.split())}
+        for line in text.splitlines():
+            match = re.match(r"\s*(?:\d+\.\s*)?(\w+)\s*:\s*(.*)", line)
+            if match and match.group(1).lower() in labels:
+                fields[labels[match.group(1).lower()]] = match.group(2)
+        if not any(fields.get(name) for name, _ in SECTIONS):
+            # Not in the expected structure at all, keep the whole text
+            fields["suggestion"] = text
+        if not fields["summary"]:
+            fields["summary"] = " ".join(text.split())
+        return cls.from_fields(fields)
+
+
+def parse_outfit(content: str) -> Outfit:
+    """The outfit of a JSON answer to OUTFIT_PROMPT, or of a free text answer"""
+    try:
+        fields = json.loads(content)
+    except ValueError:
+        fields = None
+    if isinstance(fields, dict):
+        return Outfit.from_fields(fields)
+    return Outfit.from_text(content)
+
+
+def _clean(value) -> str:
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        value = ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+    return " ".join(value.replace("**", "").split())
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0]
+
+
+class _FieldParser:
+    """
+    Incremental parser of a streamed JSON object of string fields. Returns the pieces of
+    the field values as they arrive, values of other types, such as lists, are skipped.
+    """
+
+    ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f"}
+
+    def __init__(self):
+        self._state = "outside"  # or "key", "colon", "value", "other"
+        self._key = ""
+        self._escape = None  # characters of an escape sequence after the backslash
+        self._depth = 0  # nesting of the skipped value
+        self._in_string = False  # inside a string of the skipped value
+
+    def feed(self, chunk: str) -> list[tuple[str, str, bool]]:
+        """The (field, text, complete) pieces of the values in `chunk`"""
+        pieces = []
+        value = []
+        for char in chunk:
+            if self._state == "value":
+                if self._escape is not None:
+                    self._escape += char
+                    if self._escape[0] == "u":
+                        if len(self._escape) < 5:
+                            continue
+                        try:
+                            value.append(chr(int(self._escape[1:], 16)))
+                        except ValueError:
+                            pass
+                    else:
+                        value.append(self.ESCAPES.get(self._escape, self._escape))
+                    self._escape = None
+                elif char == "\\":
+                    self._escape = ""
+                elif char == '"':
+                    pieces.append((self._key, "".join(value), True))
+                    value = []
+                    self._state = "outside"
+                else:
+                    value.append(char)
+            elif self._state == "key":
+                if char == '"':
+                    self._state = "colon"
+                else:
+                    self._key += char
+            elif self._state == "colon":
+                if char == '"':
+                    self._state = "value"
+                elif char not in ": \t\r\n":
+                    self._state = "other"
+                    self._depth = 1 if char in "[{" else 0
+            elif self._state == "other":
+                self._skip(char)
+            elif char == '"':
+                self._state = "key"
+                self._key = ""
+        if value:
+            pieces.append((self._key, "".join(value), False))
+        return pieces
+
+    def _skip(self, char: str) -> None:
+        """Advance over a value that is not a string, up to the end of the field"""
+        if self._in_string:
+            if self._escape is not None:
+                self._escape = None
+            elif char == "\\":
+                self._escape = ""
+            elif char == '"':
+                self._in_string = False
+        elif char == '"':
+            self._in_string = True
+        elif char in "[{":
+            self._depth += 1
+        elif char in "]}" and self._depth > 0:
+            self._depth -= 1
+        elif char in ",}" and self._depth == 0:
+            self._state = "outside"
+
+
+class OutfitStream:
+    """
+    Splits a streamed JSON outfit (see OUTFIT_PROMPT) into the text to display and the
+    summary to speak.
+
+    The sections are shown as they arrive, the summary is returned sentence by sentence as
+    soon as each sentence is complete. Once the stream has finished, `outfit` parses it.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._parser = _FieldParser()
+        self._section = None  # section being displayed
+        self._shown = set()  # sections that were displayed
+        self._summary = ""  # part of the summary not yet returned for speech
+        self._parsed = False  # whether any field was found in the stream
+
+    def feed(self, delta: str) -> tuple[str, list[str]]:
+        """Add a streamed piece, returns the new text to display and completed summary sentences"""
+        self.text += delta
+        display = []
+        sentences = []
+        labels = dict(SECTIONS)
+        numbers = {name: i + 1 for i, (name, _) in enumerate(SECTIONS)}
+        for field, piece, complete in self._parser.feed(delta):
+            self._parsed = True
+            if field in labels:
+                if field != self._section:
+                    separator = "\n" if self._section else ""
+                    display.append(f"{separator}{numbers[field]}. {labels[field]}: ")
+                    self._section = field
+                    self._shown.add(field)
+                display.append(piece.replace("*", ""))
+            elif field == "summary":
+                self._summary += piece
+                sentences += self._sentences(final=complete)
+        return "".join(display), sentences
+
+    def finish(self) -> tuple[str, list[str]]:
+        """Flush what was held back at the end of the stream"""
+        outfit = self.outfit
+        if not self._parsed and self.text.strip():
+            # Not a JSON answer, so nothing was shown yet
+            return outfit.description, [outfit.summary]
+        # Sections that did not arrive as strings, e.g. lists, are shown once parsed
+        missing = [
+            f"\n{i + 1}. {label}: {getattr(outfit, name)}"
+            for i, (name, label) in enumerate(SECTIONS)
+            if name not in self._shown and getattr(outfit, name)
+        ]
+        return "".join(missing), self._sentences(final=True)
+
+    @property
+    def outfit(self) -> Outfit:
+        return parse_outfit(self.text)
+
+    def _sentences(self, final: bool) -> list[str]:
+        summary = self._summary
+        if not final:
+            # A sentence is complete once the whitespace after it has arrived
+            ends = [m.end() for m in re.finditer(r"[.!?]\s", summary)]
+            summary = summary[: ends[-1]] if ends else ""
+        self._summary = self._summary[len(summary) :]
+        sentences = re.split(r"(?<=[.!?])\s+", summary.strip())
+        return [sentence for sentence in sentences if sentence]
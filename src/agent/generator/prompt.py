@@ -0,0 +1,82 @@
+import re
+
+CHARS_PER_TOKEN = 4  # rough average for English text
+SUMMARY_MARKER = "Summary:"
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def summary_of(suggestion: str, max_chars: int = 300) -> str:
+    """The summary section of a suggestion, or its start if it has no summary"""
+    if SUMMARY_MARKER in suggestion:
+        suggestion = suggestion.split(SUMMARY_MARKER, 1)[1]
+    suggestion = " ".join(suggestion.split())
+    if len(suggestion) > max_chars:
+        suggestion = suggestion[:max_chars].rsplit(" ", 1)[0] + "..."
+    return suggestion
+
+
+def dedupe(texts: list[str], threshold: float = 0.8) -> list[str]:
+    """
+    Drop texts whose words overlap with an earlier text by at least `threshold` (Jaccard
+    similarity), keeping the order and thus the first, highest ranked, of near duplicates.
+    """
+    kept, kept_words = [], []
+    for text in texts:
+        words = set(re.findall(r"\w+", text.lower()))
+        if any(
+            len(words & other) >= threshold * len(words | other) for other in kept_words
+        ):
+            continue
+        kept.append(text)
+        kept_words.append(words)
+    return kept
+
+
+def build_prompt(
+    instructions: str,
+    user_attributes: dict,
+    context: str,
+    memories: list[str],
+    previous_suggestions: list[str],
+    budget: int | None = None,
+) -> str:
+    """
+    Build the outfit prompt within a budget of estimated tokens.
+
+    Near duplicate memories are removed and only the latest previous suggestion is included
+    in full, older ones by their summary. While the prompt is over budget, the lowest
+    ranked memories are dropped first, then the oldest suggestions. The instructions, user,
+    context and latest suggestion are always included.
+    """
+    memories = dedupe(memories)
+    suggestions = [summary_of(s) for s in previous_suggestions[:-1]]
+    suggestions += previous_suggestions[-1:]
+
+    while True:
+        prompt = _format(instructions, user_attributes, context, memories, suggestions)
+        if budget is None or estimate_tokens(prompt) <= budget:
+            return prompt
+        if memories:
+            memories = memories[:-1]
+        elif len(suggestions) > 1:
+            suggestions = suggestions[1:]
+        else:
+            return prompt
+
+
+def _format(instructions, user_attributes, context, memories, suggestions) -> str:
+    # Construct the prompt using the initialization prompt, context and memories
+    prompt = f"{instructions}\n\nUSER: {user_attributes}\nCONTEXT: {context}\n\n"
+
+    if memories:
+        prompt += "PREFERENCES:\n"
+        for i, memory in enumerate(memories):
+            prompt += f"{i + 1}. {memory}\n"
+    if suggestions:
+        prompt += "PREVIOUS SUGGESTIONS:\n"
+        for i, suggestion in enumerate(suggestions):
+            prompt += f"{i + 1}. {suggestion}\n"
+    return prompt
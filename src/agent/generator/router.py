@@ -0,0 +1,122 @@
+import bisect
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+LARGE_MODEL = "mistral-large-latest"
+SMALL_MODEL = "mistral-small-latest"
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.5, 1.0, 2.0, 4.0, 8.0, 16.0)
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    model: str
+    reason: str
+
+
+@dataclass
+class LatencyHistogram:
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    total: float = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    def as_dict(self) -> dict:
+        labels = [f"<={bound}s" for bound in LATENCY_BUCKETS]
+        labels.append(f">{LATENCY_BUCKETS[-1]}s")
+        return dict(zip(labels, self.counts))
+
+
+class ModelRouter:
+    """
+    Picks the model for an outfit completion.
+
+    First recommendations go to the large model, refinements of an earlier suggestion to
+    the small model, which is faster. A call to the large model that exceeds the latency
+    budget is retried on the small model. Decisions, fallbacks and per-model latencies are
+    recorded.
+    """
+
+    def __init__(
+        self,
+        large: str = LARGE_MODEL,
+        small: str = SMALL_MODEL,
+        latency_budget: float = 8.0,
+    ):
+        """
+        Args:
+            large: Model for first recommendations
+            small: Model for refinements and as fallback
+            latency_budget: Seconds the large model gets per outfit before falling back,
+                for a streamed completion this is the time until the first token
+        """
+        self.large = large
+        self.small = small
+        self.latency_budget = latency_budget
+
+        self.decisions: deque[RoutingDecision] = deque(maxlen=100)
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self.routed = 0  # completions routed
+        self.fallbacks = 0  # completions that fell back to the small model
+        self._lock = threading.Lock()
+
+    def route(self, previous_suggestions: list[str]) -> RoutingDecision:
+        if previous_suggestions:
+            decision = RoutingDecision(self.small, "refinement")
+        else:
+            decision = RoutingDecision(self.large, "first recommendation")
+        with self._lock:
+            self.routed += 1
+        return self._record_decision(decision)
+
+    def timeout_ms(self, decision: RoutingDecision, outfits: int = 1) -> int | None:
+        """
+        Time limit of a call, None for calls that have nothing to fall back to. A
+        non-streamed answer with several outfits only arrives once all are generated, so
+        the limit grows with their number.
+        """
+        if decision.model == self.small:
+            return None
+        return int(self.latency_budget * outfits * 1000)
+
+    def fallback(self, decision: RoutingDecision) -> RoutingDecision | None:
+        if decision.model == self.small:
+            return None
+        with self._lock:
+            self.fallbacks += 1
+        return self._record_decision(
+            RoutingDecision(self.small, f"{decision.model} exceeded latency budget")
+        )
+
+    def record_latency(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms.setdefault(model, LatencyHistogram()).observe(seconds)
+
+    @property
+    def fallback_rate(self) -> float:
+        return self.fallbacks / self.routed if self.routed else 0.0
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                model: dict(
+                    calls=histogram.count,
+                    mean=histogram.total / histogram.count,
+                    histogram=histogram.as_dict(),
+                )
+                for model, histogram in self.histograms.items()
+            }
+
+    def _record_decision(self, decision: RoutingDecision) -> RoutingDecision:
+        with self._lock:
+            self.decisions.append(decision)
+        return decision
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so that trivially different spellings share a cache entry"""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for text embeddings, keyed on (embedding model, normalized text).
+
+    Hot entries are kept in an in-memory LRU, every entry is also written to disk as a
+    content-addressed .npy file so embeddings survive restarts of the application.
+    """
+
+    def __init__(self, cache_dir: str = None, max_entries: int = 4096):
+        """
+        Args:
+            cache_dir (str, optional): Directory for the on-disk tier. None disables it.
+            max_entries (int): Maximum number of embeddings kept in memory
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Hit/miss counters, see `stats`
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        """Content address of an embedding"""
+        payload = f"{model}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get(self, model: str, text: str) -> np.ndarray | None:
+        """Return the cached embedding, or None on a miss"""
+        key = self.key(model, text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return embedding
+
+        embedding = self._read(key)
+        with self._lock:
+            if embedding is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, embedding)
+        return embedding
+
+    def put(self, model: str, text: str, embedding: np.ndarray) -> None:
+        """Store an embedding in both tiers"""
+        key = self.key(model, text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, embedding)
+        self._write(key, embedding)
+
+    def clear(self) -> None:
+        """Drop the in-memory tier, the on-disk tier is left untouched"""
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return dict(
+            memory_hits=self.memory_hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            hit_rate=hits / lookups if lookups else 0.0,
+        )
+
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def _read(self, key: str) -> np.ndarray | None:
+        if self.cache_dir is None:
+            return None
+        try:
+            return np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key: str, embedding: np.ndarray) -> None:
+        if self.cache_dir is None:
+            return
+        # Write to a temporary file first so a crash never leaves a truncated entry behind
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, embedding)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write embedding cache entry: {e}")
@@ -0,0 +1,185 @@
+import json
+import os
+import struct
+import numpy as np
+
+SNAPSHOT_MAGIC = b"CTXIDX"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64  # data starts at a multiple of this many bytes
+
+
+class ContextIndex:
+    """
+    Per-user index of conversation context embeddings.
+
+    Row i of `embeddings` holds the unit-normalized context embedding of conversation i,
+    `counts[i]` is the number of preferences stored for that conversation. Preferences are
+    addressed by a flat position: the preferences of conversation i occupy the range
+    offsets[i]:offsets[i + 1]. `keys[i]` identifies the context the row was computed from.
+    """
+
+    def __init__(self, dim: int = None, capacity: int = 16):
+        self.dim = dim
+        self.size = 0
+        self._embeddings = None if dim is None else np.zeros((capacity, dim), np.float32)
+        self._counts = np.zeros(capacity, np.int64)
+        self._keys = np.zeros(capacity, np.int64)
+        self.modified = False
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        if self._embeddings is None:
+            return np.zeros((0, 0), np.float32)
+        return self._embeddings[: self.size]
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._counts[: self.size]
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._keys[: self.size]
+
+    @property
+    def offsets(self) -> np.ndarray:
+        offsets = np.zeros(self.size + 1, np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+        return offsets
+
+    def add_conversation(
+        self, embedding: np.ndarray, n_preferences: int = 0, key: int = 0
+    ) -> int:
+        """Append the context embedding of a new conversation, returns its row"""
+        embedding = np.asarray(embedding, np.float32)
+        if self._embeddings is None:
+            self.dim = embedding.shape[0]
+            self._embeddings = np.zeros((len(self._counts), self.dim), np.float32)
+        if self.size == len(self._counts) or not self._embeddings.flags.writeable:
+            self._grow()  # also copies memory-mapped embeddings before the first write
+
+        # Normalize once here, so that ranking is a plain dot product
+        self._embeddings[self.size] = embedding / np.linalg.norm(embedding)
+        self._counts[self.size] = n_preferences
+        self._keys[self.size] = key
+        self.size += 1
+        self.modified = True
+        return self.size - 1
+
+    def add_preference(self, conversation_index: int) -> None:
+        self._counts[conversation_index] += 1
+        self.modified = True
+
+    def truncate(self, size: int) -> None:
+        """Drop all conversations from row `size` onwards"""
+        if size < self.size:
+            self.size = size
+            self.modified = True
+
+    def top_k(self, query: np.ndarray, k: int) -> list[tuple[int, int]]:
+        """
+        Rank all preferences by the similarity of their conversation context to the query.
+
+        Returns (conversation index, preference index) pairs, most similar first. Ties are
+        broken in favour of the most recent preferences.
+        """
+        offsets = self.offsets
+        n_preferences = int(offsets[-1])
+        k = min(k, n_preferences)
+        if k <= 0:
+            return []
+
+        # Cosine similarity, since both sides have unit norm
+        similarities = self.embeddings @ np.asarray(query, np.float32)
+        scores = np.repeat(similarities, self.counts)
+
+        if k < n_preferences:
+            # All preferences tied with the k-th best are kept, so that recency decides
+            # between them below rather than the partition
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(n_preferences)
+        # Sort by similarity, then by recency
+        candidates = candidates[np.lexsort((-candidates, -scores[candidates]))][:k]
+
+        conversations = np.searchsorted(offsets, candidates, side="right") - 1
+        return [
+            (int(c), int(p - offsets[c])) for c, p in zip(conversations, candidates)
+        ]
+
+    def save(self, path: str, model: str) -> None:
+        """
+        Write a snapshot that `load` can map back without copying.
+
+        Layout: magic, header length, JSON header, padding, then the float32 embeddings and
+        the int64 keys and offsets, each starting at an aligned position.
+        """
+        header = json.dumps(
+            dict(version=SNAPSHOT_VERSION, model=model, dim=self.dim, size=self.size)
+        ).encode("utf-8")
+        prefix = SNAPSHOT_MAGIC + struct.pack("<I", len(header)) + header
+        prefix += b"\0" * (-len(prefix) % SNAPSHOT_ALIGNMENT)
+
+        embeddings = self.embeddings if self.size else np.zeros((0, self.dim or 0))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(prefix)
+            f.write(np.ascontiguousarray(embeddings, "<f4").tobytes())
+            f.write(np.ascontiguousarray(self.keys, "<i8").tobytes())
+            f.write(np.ascontiguousarray(self.offsets, "<i8").tobytes())
+        os.replace(tmp_path, path)
+        self.modified = False
+
+    @classmethod
+    def load(cls, path: str, model: str) -> "ContextIndex | None":
+        """
+        Map a snapshot written by `save` into memory.
+
+        Returns None if there is no usable snapshot, including when it was computed with a
+        different embedding model. The embeddings stay memory-mapped until a conversation
+        is added, at which point they are copied into a growable array.
+        """
+        try:
+            with open(path, "rb") as f:
+                if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                    return None
+                (header_length,) = struct.unpack("<I", f.read(4))
+                header = json.loads(f.read(header_length))
+        except (OSError, ValueError, struct.error):
+            return None
+        if header.get("version") != SNAPSHOT_VERSION or header.get("model") != model:
+            return None
+
+        size, dim = header["size"], header["dim"]
+        offset = len(SNAPSHOT_MAGIC) + 4 + header_length
+        offset += -offset % SNAPSHOT_ALIGNMENT
+
+        index = cls()
+        index.dim, index.size = dim, size
+        if size == 0:
+            return index
+        try:
+            index._embeddings = np.memmap(
+                path, dtype="<f4", mode="r", offset=offset, shape=(size, dim)
+            )
+            tables = np.memmap(
+                path, dtype="<i8", mode="r", offset=offset + 4 * size * dim,
+                shape=(2 * size + 1,),
+            )
+        except (OSError, ValueError):
+            return None
+
+        # Keys and counts are small and mutable, so they are copied
+        index._keys = np.array(tables[:size])
+        index._counts = np.diff(tables[size:])
+        return index
+
+    def _grow(self) -> None:
+        capacity = max(16, 2 * self.size, len(self._counts))
+        embeddings = np.zeros((capacity, self.dim), np.float32)
+        embeddings[: self.size] = self._embeddings[: self.size]
+        counts = np.zeros(capacity, np.int64)
+        counts[: self.size] = self._counts[: self.size]
+        keys = np.zeros(capacity, np.int64)
+        keys[: self.size] = self._keys[: self.size]
+        self._embeddings, self._counts, self._keys = embeddings, counts, keys
@@ -1,41 +1,147 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from .schema import UserSchema, Preference, Context, Conversation, User
-from .retrieval import retrieve
+from .retrieval import EMBEDDING_MODEL, retrieve, update_index, validate_index
+from .index import ContextIndex
+from .store import SQLiteStore
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "snapshots")
 
 
 @dataclass
 class Memory:
     data: UserSchema = field(default_factory=dict)
     long_term_retrieval: bool = field(default=True)
+    indexes: dict[str, ContextIndex] = field(default_factory=dict)
+    # Optional durable backend, `data` then only holds the users accessed so far
+    store: SQLiteStore | None = field(default=None)
+    # Optional directory with memory-mapped snapshots of the context indexes
+    snapshot_dir: str | None = field(default=None)
+    _pending: list[tuple[str, int, Preference]] = field(default_factory=list, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    # A single writer thread, so that background flushes are applied in order
+    _writer: ThreadPoolExecutor = field(
+        default_factory=lambda: ThreadPoolExecutor(max_workers=1), repr=False
+    )
 
     def user_exists(self, user_name: str) -> bool:
-        return user_name in self.data
+        if user_name in self.data:
+            return True
+        return self.store is not None and self.store.user_exists(user_name)
 
     def create_user(self, user: User) -> None:
         self.data[user["name"]] = user
+        if self.store is not None:
+            self.store.create_user(user)
+
+    def list_user_names(self) -> list[str]:
+        """Names of all users, without loading them, see `get_user`"""
+        names = list(self.data)
+        if self.store is not None:
+            names += [n for n in self.store.list_user_names() if n not in self.data]
+        return names
 
-    def list_users(self) -> list[User]:
-        return list(self.data.values())
+    def get_user(self, user_name: str) -> User:
+        return self._user(user_name)
 
     def create_conversation(self, user: str, context: str) -> int:
         conversation = dict(context=context, preferences=[])
-        self.data[user]["conversations"].append(conversation)
-        return len(self.data[user]["conversations"]) - 1  # index of the conversation
+        conversations = self._user(user)["conversations"]
+        conversations.append(conversation)
+        conversation_index = len(conversations) - 1
+        if self.store is not None:
+            self.store.create_conversation(user, conversation_index, context)
+        return conversation_index
 
     def add_preference(self, user, conversation_index, preference) -> None:
-        self.data[user]["conversations"][conversation_index]["preferences"].append(
+        self._user(user)["conversations"][conversation_index]["preferences"].append(
             preference
         )
+        index = self.indexes.get(user)
+        if index is not None and conversation_index < index.size:
+            index.add_preference(conversation_index)
+
+        # Written to the store on the next flush, see `flush`
+        if self.store is not None:
+            with self._lock:
+                self._pending.append((user, conversation_index, preference))
+
+    def flush(self) -> None:
+        """Persist the preferences added since the last flush in a single transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if self.store is not None:
+            self.store.add_preferences(pending)
+
+    def flush_async(self) -> Future:
+        """Like `flush`, but writes in the background so the conversation does not wait"""
+        return self._writer.submit(self.flush)
+
+    def save_snapshots(self) -> None:
+        """Write a snapshot of every context index that changed since it was loaded"""
+        if self.snapshot_dir is None:
+            return
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        for user, index in self.indexes.items():
+            if index.modified:
+                try:
+                    index.save(self._snapshot_path(user), EMBEDDING_MODEL)
+                except OSError as e:
+                    print(f"Failed to write snapshot for {user}: {e}")
+
+    def close(self) -> None:
+        self._writer.shutdown(wait=True)  # finish the background flushes
+        self.flush()
+        self.save_snapshots()
+        if self.store is not None:
+            self.store.close()
 
     def retrieve(self, user, conversation_index) -> list[str]:
-        conversations = self.data[user]["conversations"]
+        conversations = self._user(user)["conversations"]
+        index = self._index(user) if self.long_term_retrieval else None
         selection = retrieve(
-            conversations, conversation_index, self.long_term_retrieval
+            conversations,
+            conversation_index,
+            index,
+            long_term_retrieval=self.long_term_retrieval,
         )
 
         # Convert each preference entry to a single string
         return list(map(lambda p: self._preference_text_format(p), selection))
 
+    def _user(self, user) -> User:
+        """The user's data, loaded from the store on first access"""
+        if user not in self.data and self.store is not None:
+            loaded = self.store.load_user(user)
+            if loaded is not None:
+                self.data[user] = loaded
+        return self.data[user]
+
+    def _index(self, user) -> ContextIndex:
+        """Context index of this user, built on first use and kept in sync with new conversations"""
+        conversations = self._user(user)["conversations"]
+        index = self.indexes.get(user)
+        if index is None:
+            index = self._load_snapshot(user, conversations) or ContextIndex()
+            self.indexes[user] = index
+        return update_index(index, conversations)
+
+    def _load_snapshot(self, user, conversations) -> ContextIndex | None:
+        if self.snapshot_dir is None:
+            return None
+        # Snapshots of another embedding model are rejected by `load`
+        index = ContextIndex.load(self._snapshot_path(user), EMBEDDING_MODEL)
+        if index is None:
+            return None
+        return validate_index(index, conversations)
+
+    def _snapshot_path(self, user) -> str:
+        name = hashlib.sha1(user.encode("utf-8")).hexdigest()
+        return os.path.join(self.snapshot_dir, f"{name}.ctx")
+
     # TODO: this formatting for the prompt should probably be part of the generation code
     def _preference_text_format(self, preference):
         return f"Of the outfit '{preference['outfit']}', the user thinks: {preference['response']}, it makes them feel {preference['emotion']}"
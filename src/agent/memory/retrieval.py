@@ -1,76 +1,147 @@
-import sys
+import hashlib
+import os
 from .schema import Conversation, Preference, Context
+from .embedding_cache import EmbeddingCache
+from .index import ContextIndex
 import numpy as np
 from typing import List, Tuple
 import ollama
 
 EMBEDDING_MODEL = "all-minilm:latest"
-
-try:
-    installed_models: ollama.ListResponse = ollama.list()
-    installed_model_names = [m.model for m in installed_models.models]
-    print(f"Found installed Ollama models: {installed_model_names}")
-    if EMBEDDING_MODEL not in installed_model_names:
-        print(f"Model {EMBEDDING_MODEL} not found. Installing...")
-        ollama.pull(EMBEDDING_MODEL)
-        print(f"Model {EMBEDDING_MODEL} installed successfully.")
-except Exception as e:
-    print(f"Ollama client not installed or not running: {e}")
-    print("Please install the ollama client and start the app.")
-    sys.exit(1)
+EMBEDDING_BATCH_SIZE = 64  # maximum number of texts per embedding request
+
+# Embeddings of contexts are cached in memory and on disk, so that past conversations
+# do not have to be re-embedded on every turn (or after a restart)
+embedding_cache = EmbeddingCache(
+    cache_dir=os.path.join(os.path.dirname(__file__), "embedding_cache")
+)
+
+
+def check_ollama(pull: bool = True) -> bool:
+    """
+    Readiness probe for the embedding backend, installs the embedding model if needed.
+
+    Returns False instead of raising when Ollama is not installed or not running, so the
+    caller can decide how to degrade.
+    """
+    try:
+        installed_models: ollama.ListResponse = ollama.list()
+        installed_model_names = [m.model for m in installed_models.models]
+        print(f"Found installed Ollama models: {installed_model_names}")
+        if EMBEDDING_MODEL not in installed_model_names:
+            if not pull:
+                return False
+            print(f"Model {EMBEDDING_MODEL} not found. Installing...")
+            ollama.pull(EMBEDDING_MODEL)
+            print(f"Model {EMBEDDING_MODEL} installed successfully.")
+        return True
+    except Exception as e:
+        print(f"Ollama client not installed or not running: {e}")
+        print("Please install the ollama client and start the app.")
+        return False
 
 
 def retrieve(
-    conversations: list[Conversation], conversation_index: int, top_k: int = 5, long_term_retrieval: bool = True
+    conversations: list[Conversation],
+    conversation_index: int,
+    index: ContextIndex,
+    top_k: int = 5,
+    long_term_retrieval: bool = True,
 ) -> List[Preference]:
     """Retrieve relevant preference memories from these conversations, based on the current conversation"""
 
-    current_context = conversations[conversation_index]["context"]
-    current_embedding = embed_context(current_context)
-
-    memories = []
-    context_similarities = []
-
     if not long_term_retrieval:
-        return reversed(conversations[conversation_index]["preferences"])[:top_k] # Return the most recent preferences
-
-    # Compare current context with all other conversations
-    for i, conversation in enumerate(conversations):
-        if i == conversation_index:
-            context_sim = 1
-        context_sim = compute_context_sim(current_embedding, conversation["context"])
-
-        # add all preferences with the same context similarity
-        prefs = conversation["preferences"]
-        memories.extend(prefs)
-        context_similarities.extend([context_sim] * len(prefs))
-
-    # Sort memories by context similarity (highest to lowest)
-    sorted_indices = np.argsort(context_similarities)[::-1]
-    memories = [memories[i] for i in sorted_indices[:top_k]] # Return the most recent preferences of the most similar conversations
-    return memories
-
-
-def compute_context_sim(current_embedding, context):
-    other_embedding = embed_context(context)
-    dot_product = np.dot(current_embedding, other_embedding)
-    return dot_product  # equal to cossim since norm is 1 for both
+        return list(reversed(conversations[conversation_index]["preferences"]))[:top_k] # Return the most recent preferences
+
+    # Compare current context with all conversations in a single matrix-vector product,
+    # returns the most recent preferences of the most similar conversations
+    current_embedding = index.embeddings[conversation_index]
+    ranking = index.top_k(current_embedding, top_k)
+    return [conversations[c]["preferences"][p] for c, p in ranking]
+
+
+def update_index(index: ContextIndex, conversations: list[Conversation]) -> ContextIndex:
+    """Add the conversations that are not in the index yet"""
+    missing = conversations[index.size :]
+    if not missing:
+        return index
+
+    contexts = [conversation["context"] for conversation in missing]
+    embeddings = embed_contexts(contexts)
+    for embedding, conversation in zip(embeddings, missing):
+        index.add_conversation(
+            embedding,
+            len(conversation["preferences"]),
+            key=context_key(conversation["context"]),
+        )
+    return index
+
+
+def validate_index(index: ContextIndex, conversations: list[Conversation]) -> ContextIndex:
+    """
+    Make an index loaded from a snapshot consistent with the conversations.
+
+    Rows from the first conversation whose context changed onwards are dropped, so they are
+    re-embedded by `update_index`. Preference counts are taken from the conversations.
+    """
+    size = min(index.size, len(conversations))
+    keys = [context_key(c["context"]) for c in conversations[:size]]
+    mismatches = np.flatnonzero(index.keys[:size] != np.array(keys, np.int64))
+    index.truncate(int(mismatches[0]) if len(mismatches) else size)
+    counts = np.array([len(c["preferences"]) for c in conversations[: index.size]], np.int64)
+    if not np.array_equal(index.counts, counts):
+        index.counts[:] = counts
+        index.modified = True
+    return index
 
 
 def embed_context(context: Context) -> np.ndarray:
     """Generate embeddings for a context using nomic-embed-text model"""
-
-    # Convert to a single string
-    text = f"The occasion is {context['occasion']}, the weather is {context['weather']}, the preferred style is {context['style']}"
-
-    # Call ollama to get embedding(s)
-    response = ollama.embed(model=EMBEDDING_MODEL, input=text)
-    embeddings = np.array(response["embeddings"])
-
-    # average embeddings if there are more than one. Ensure norm
-    embedding = np.mean(embeddings, axis=0)
-    norm = np.linalg.norm(embedding)
-    if not np.isclose(norm, 1, rtol=1e-3):
-        raise ValueError("Embedding is not normalized!")
-
-    return embedding
+    return embed_contexts([context])[0]
+
+
+def embed_contexts(
+    contexts: list[Context], batch_size: int = EMBEDDING_BATCH_SIZE, client=None
+) -> np.ndarray:
+    """
+    Embed several contexts at once, returns one unit-norm embedding per row.
+
+    Cached embeddings are reused, the remaining texts are sent to ollama in as few requests
+    as the batch size allows. `client` defaults to the module-level ollama client.
+    """
+    client = client or ollama
+
+    # Convert to single strings
+    texts = [context_text(context) for context in contexts]
+    embeddings: list[np.ndarray] = [
+        embedding_cache.get(EMBEDDING_MODEL, text) for text in texts
+    ]
+
+    # Deduplicate, identical contexts only need to be embedded once
+    uncached = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+    computed = {}
+    for start in range(0, len(uncached), batch_size):
+        batch = uncached[start : start + batch_size]
+
+        # Call ollama to get one embedding per input text. Ensure norm
+        response = client.embed(model=EMBEDDING_MODEL, input=batch)
+        for text, embedding in zip(batch, np.asarray(response["embeddings"], np.float32)):
+            norm = np.linalg.norm(embedding)
+            if not np.isclose(norm, 1, rtol=1e-3):
+                raise ValueError("Embedding is not normalized!")
+            embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+            computed[text] = embedding
+
+    embeddings = [e if e is not None else computed[t] for t, e in zip(texts, embeddings)]
+    return np.stack(embeddings) if embeddings else np.zeros((0, 0), np.float32)
+
+
+def context_key(context: Context) -> int:
+    """Stable 64-bit identifier of a context, used to match snapshot rows to conversations"""
+    digest = hashlib.sha256(context_text(context).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little", signed=True)
+
+
+def context_text(context: Context) -> str:
+    """Describe a context as a single sentence, which is what gets embedded"""
+    return f"The occasion is {context['occasion']}, the weather is {context['weather']}, the preferred style is {context['style']}"
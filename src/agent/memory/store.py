@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import threading
+from .schema import Context, Conversation, Preference, User
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "memory.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    gender TEXT,
+    height TEXT,
+    body_type TEXT
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    user TEXT NOT NULL REFERENCES users(name),
+    position INTEGER NOT NULL,
+    occasion TEXT,
+    weather TEXT,
+    style TEXT,
+    PRIMARY KEY (user, position)
+);
+CREATE TABLE IF NOT EXISTS preferences (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    outfit TEXT,
+    response TEXT,
+    emotion TEXT,
+    FOREIGN KEY (user, position) REFERENCES conversations(user, position)
+);
+CREATE INDEX IF NOT EXISTS preferences_by_conversation ON preferences(user, position);
+"""
+
+
+class SQLiteStore:
+    """
+    Durable storage for users, conversations and preferences.
+
+    A conversation is identified by its user and its position in the user's list of
+    conversations, which is the conversation index used throughout `Memory`.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        # The connection is shared between the GUI and conversation threads, guarded by a lock
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.executescript(SCHEMA)
+
+    def user_exists(self, name: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM users WHERE name = ?", (name,)
+            ).fetchone()
+        return row is not None
+
+    def list_user_names(self) -> list[str]:
+        with self._lock:
+            rows = self._connection.execute("SELECT name FROM users ORDER BY rowid")
+            return [name for (name,) in rows]
+
+    def load_user(self, name: str) -> User | None:
+        """Load a user with all of their conversations and preferences"""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT name, gender, height, body_type FROM users WHERE name = ?",
+                (name,),
+            ).fetchone()
+            if row is None:
+                return None
+            conversation_rows = self._connection.execute(
+                "SELECT occasion, weather, style FROM conversations "
+                "WHERE user = ? ORDER BY position",
+                (name,),
+            ).fetchall()
+            preference_rows = self._connection.execute(
+                "SELECT position, outfit, response, emotion FROM preferences "
+                "WHERE user = ? ORDER BY id",
+                (name,),
+            ).fetchall()
+
+        conversations: list[Conversation] = [
+            dict(
+                context=Context(occasion=occasion, weather=weather, style=style),
+                preferences=[],
+            )
+            for occasion, weather, style in conversation_rows
+        ]
+        for position, outfit, response, emotion in preference_rows:
+            conversations[position]["preferences"].append(
+                Preference(outfit=outfit, response=response, emotion=emotion)
+            )
+
+        name, gender, height, body_type = row
+        return User(
+            name=name,
+            gender=gender,
+            height=height,
+            body_type=body_type,
+            conversations=conversations,
+        )
+
+    def create_user(self, user: User) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO users (name, gender, height, body_type) "
+                "VALUES (?, ?, ?, ?)",
+                (user["name"], user["gender"], user["height"], user["body_type"]),
+            )
+        for position, conversation in enumerate(user.get("conversations", [])):
+            self.create_conversation(user["name"], position, conversation["context"])
+            self.add_preferences(
+                [(user["name"], position, p) for p in conversation["preferences"]]
+            )
+
+    def create_conversation(self, user: str, position: int, context: Context) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO conversations "
+                "(user, position, occasion, weather, style) VALUES (?, ?, ?, ?, ?)",
+                (user, position, context["occasion"], context["weather"], context["style"]),
+            )
+
+    def add_preferences(self, preferences: list[tuple[str, int, Preference]]) -> None:
+        """Write (user, conversation index, preference) entries in a single transaction"""
+        if not preferences:
+            return
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT INTO preferences (user, position, outfit, response, emotion) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (user, position, p["outfit"], p["response"], p["emotion"])
+                    for user, position, p in preferences
+                ],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class PhraseCache:
+    """
+    Cache of synthesized speech, keyed on a hash of the text, language and speed.
+
+    Audio files are kept in a size-bounded directory, evicting the least recently used
+    files first. Decoded audio of the most recently used phrases is also kept in memory,
+    so those play without any network or decoding latency.
+    """
+
+    def __init__(self, cache_dir, max_bytes=50 * 2**20, max_decoded=64):
+        """
+        Args:
+            cache_dir (str): Directory for the audio files
+            max_bytes (int): Maximum total size of the audio files
+            max_decoded (int): Maximum number of phrases kept decoded in memory
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_decoded = max_decoded
+        self._decoded = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text, lang, slow):
+        payload = f"{lang}\0{int(slow)}\0{' '.join(text.split())}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def get_audio(self, key):
+        """Decoded (audio, sample rate) of a phrase, or None if it is not in memory"""
+        with self._lock:
+            audio = self._decoded.get(key)
+            if audio is not None:
+                self._decoded.move_to_end(key)
+                self.hits += 1
+            return audio
+
+    def put_audio(self, key, audio):
+        with self._lock:
+            self._decoded[key] = audio
+            self._decoded.move_to_end(key)
+            while len(self._decoded) > self.max_decoded:
+                self._decoded.popitem(last=False)
+
+    def get_bytes(self, key):
+        """Contents of the cached audio file of a phrase, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put_bytes(self, key, data):
+        """Store the audio file of a phrase"""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+        )
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def _evict(self):
+        """Remove the least recently used files until the cache fits in `max_bytes`"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
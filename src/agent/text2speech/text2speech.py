@@ -1,24 +1,107 @@
+import io
 import os
-import uuid
+import re
 import threading
-import time
 import queue
+from concurrent.futures import ThreadPoolExecutor
 from gtts import gTTS
-import librosa
 import sounddevice as sd
+import soundfile as sf
+from .cache import PhraseCache
+
+# Shared between engines, so the cache survives starting a new conversation
+phrase_cache = PhraseCache(os.path.join(os.path.dirname(__file__), "phrase_cache"))
+
+def decode_audio(data):
+    """Decode mp3 bytes at their native sample rate, without resampling"""
+    audio, sr = sf.read(io.BytesIO(data), dtype="float32")
+    return audio, sr
+
+class PlaybackHandle:
+    """
+    Audio playing on the default output device, which can be cancelled before it ends.
+    Samples are fed from a stream callback, so cancelling takes effect within one block.
+    """
+
+    def __init__(self, audio, sr):
+        self._audio = audio.reshape(len(audio), -1)
+        self._position = 0
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._stream = sd.OutputStream(
+            samplerate=sr,
+            channels=self._audio.shape[1],
+            dtype="float32",
+            callback=self._callback,
+            finished_callback=self._finished.set,
+        )
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def start(self):
+        self._stream.start()
+        return self
+
+    def cancel(self):
+        """Stop playing, can be called from any thread"""
+        self._cancelled.set()
+
+    def wait(self):
+        """Block until the audio has played or was cancelled, returns False if cancelled"""
+        self._finished.wait()
+        self._stream.close()
+        return not self.cancelled
+
+    def _callback(self, outdata, frames, time, status):
+        if self._cancelled.is_set():
+            raise sd.CallbackAbort  # discards the audio that is still buffered
+        chunk = self._audio[self._position : self._position + frames]
+        outdata[: len(chunk)] = chunk
+        outdata[len(chunk) :] = 0
+        self._position += len(chunk)
+        if len(chunk) < frames:
+            raise sd.CallbackStop
+
+def play_pcm(audio, sr):
+    PlaybackHandle(audio, sr).start().wait()  # Wait until audio is done playing
 
 def play_audio(filename):
-    audio, sr = librosa.load(filename)
-    sd.play(audio, sr)
-    sd.wait()  # Wait until audio is done playing
+    with open(filename, "rb") as f:
+        play_pcm(*decode_audio(f.read()))
+
+def split_sentences(text, min_length=40):
+    """
+    Split text into chunks at sentence boundaries, to synthesize and play them one by one.
+    Sentences shorter than `min_length` characters are merged with the next one.
+    """
+    chunks = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        if chunks and len(chunks[-1]) < min_length:
+            chunks[-1] += " " + sentence
+        elif sentence:
+            chunks.append(sentence)
+    return chunks
 
 class Text2Speech:
     """
     A class to handle text-to-speech conversion and playback.
-    Uses gTTS for conversion and playsound for audio playback.
+    Uses gTTS for conversion and sounddevice for audio playback. Audio is kept in memory,
+    only cached phrases are written to disk.
     """
 
-    def __init__(self, lang="en", slow=False, debug=False):
+    def __init__(
+        self,
+        lang="en",
+        slow=False,
+        debug=False,
+        lookahead=3,
+        workers=3,
+        cache=phrase_cache,
+        max_phrase_length=150,
+        on_idle=None,
+    ):
         """
         Initialize the Text2Speech engine.
 
@@ -26,25 +109,54 @@ class Text2Speech:
             lang (str): Language code for the speech (default: "en")
             slow (bool): Whether to speak slowly (default: False)
             debug (bool): Whether to print debug information (default: False)
+            lookahead (int): How many chunks synthesis may run ahead of playback (default: 3)
+            workers (int): Number of chunks synthesized concurrently (default: 3)
+            cache (PhraseCache): Cache for synthesized phrases (default: shared cache)
+            max_phrase_length (int): Longest message that is cached, longer messages such
+                as outfit summaries are unlikely to repeat (default: 150)
+            on_idle (callable, optional): Called from the playback thread whenever all
+                queued speech has finished playing
         """
         self.lang = lang
         self.slow = slow
-        self.audio_files = []
         self.current_audio = None
         self.debug = debug
+        self.cache = cache
+        self.max_phrase_length = max_phrase_length
+        self.on_idle = on_idle
 
-        # Speech queue and processing thread
+        # Two-stage pipeline: texts are split into sentences that are synthesized
+        # concurrently into `ready_queue` while earlier ones are still playing
         self.speech_queue = queue.Queue()
-        self.is_speaking = False
+        self.ready_queue = queue.Queue(maxsize=lookahead)
+        self.synthesis_pool = ThreadPoolExecutor(max_workers=workers)
         self.stop_requested = False
 
-        # Start speech processing thread
-        self.speech_thread = threading.Thread(target=self._process_speech_queue)
-        self.speech_thread.daemon = True
-        self.speech_thread.start()
+        # Number of items queued but not finished playing, signalled when it changes
+        self._pending = 0
+        self._pending_changed = threading.Condition()
+
+        # Queued items are tagged with the generation they were queued in, `interrupt`
+        # starts a new generation so that the workers drop everything queued before it
+        self._generation = 0
+        self._playback = None  # handle of the chunk that is playing
+        self._playback_lock = threading.Lock()
+
+        # Start the synthesis and playback threads
+        self.synthesis_thread = threading.Thread(target=self._process_speech_queue)
+        self.synthesis_thread.daemon = True
+        self.synthesis_thread.start()
+        self.playback_thread = threading.Thread(target=self._process_ready_queue)
+        self.playback_thread.daemon = True
+        self.playback_thread.start()
 
         self._log("Text2Speech initialized")
 
+    @property
+    def is_speaking(self):
+        """Whether there is speech queued, being synthesized or playing"""
+        return self._pending > 0
+
     def _log(self, message):
         """Internal method for logging debug messages"""
         if self.debug:
@@ -52,26 +164,27 @@ class Text2Speech:
 
     def convert_to_speech(self, text):
         """
-        Convert text to speech and save it as an audio file.
+        Convert text to speech.
 
         Args:
             text (str): The text to convert to speech
 
         Returns:
-            str: Path to the generated audio file
+            tuple: The decoded audio samples and their sample rate
         """
-        # Process text to extract summary if available
-        original_text = text
+        self.current_audio = decode_audio(self.synthesize(self.prepare_text(text)))
+        return self.current_audio
 
-        # Check for Summary section
-        if "Summary:" in text:
-            # Get only the text after "Summary:"
-            text = text.split("Summary:", 1)[1].strip()
+    def prepare_text(self, text):
+        """
+        Strip the list markers of a message, so that only its text is spoken.
 
-        # If the text is empty after processing, fall back to original
-        if not text:
-            text = original_text
+        Args:
+            text (str): The message
 
+        Returns:
+            str: The text to synthesize
+        """
         # Remove any markdown numbered/bullet list markers
         lines = text.split('\n')
         processed_lines = []
@@ -86,20 +199,61 @@ class Text2Speech:
                 line = line[2:]
             processed_lines.append(line)
 
-        text = ' '.join(processed_lines)
+        return ' '.join(processed_lines)
+
+    def synthesize(self, text):
+        """
+        Synthesize already prepared text, without writing it to disk.
+
+        Args:
+            text (str): The text to synthesize
+
+        Returns:
+            bytes: The synthesized audio in mp3 format
+        """
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=self.lang, slow=self.slow).write_to_fp(buffer)
+        return buffer.getvalue()
 
-        # Generate a unique filename
-        filename = f"speech_{uuid.uuid4()}.mp3"
+    def render(self, text, cache=False):
+        """
+        Get the decoded audio of prepared text, from the phrase cache when possible.
 
-        # Create the TTS object and save to file
-        tts = gTTS(text=text, lang=self.lang, slow=self.slow)
-        tts.save(filename)
+        Args:
+            text (str): The text to synthesize
+            cache (bool): Whether to store the result in the phrase cache
 
-        # Add to our list of generated files
-        self.audio_files.append(filename)
-        self.current_audio = filename
+        Returns:
+            tuple: The audio samples and their sample rate
+        """
+        key = self.cache.key(text, self.lang, self.slow)
+        audio = self.cache.get_audio(key)
+        if audio is not None:
+            return audio
+
+        data = self.cache.get_bytes(key)
+        if data is None:
+            data = self.synthesize(text)
+            if cache:
+                self.cache.put_bytes(key, data)
+
+        # Decoded once, the cache and the playback stage both use the decoded audio
+        audio = decode_audio(data)
+        if cache:
+            self.cache.put_audio(key, audio)
+        return audio
+
+    def prerender(self, texts):
+        """
+        Synthesize and decode phrases into the cache in the background, so they play
+        without delay later on.
 
-        return filename
+        Args:
+            texts (list): The messages to prepare, as they would be passed to `speak`
+        """
+        for text in texts:
+            for chunk in split_sentences(self.prepare_text(text)):
+                self.synthesis_pool.submit(self.render, chunk, True)
 
     def play_speech(self, text=None, filename=None):
         """
@@ -115,29 +269,32 @@ class Text2Speech:
         try:
             # If text is provided, convert it first
             if text:
-                filename = self.convert_to_speech(text)
-
-            # If no filename provided and no current audio, can't play
-            if not filename and not self.current_audio:
+                audio = self.convert_to_speech(text)
+            elif filename:
+                with open(filename, "rb") as f:
+                    audio = decode_audio(f.read())
+            else:
+                # Replay the current audio, if there is any
+                audio = self.current_audio
+            if audio is None:
                 return False
 
-            # Use the provided filename or the current audio
-            audio_file = filename or self.current_audio
-
             # Play the audio in a separate thread to avoid blocking
-            threading.Thread(target=play_audio, args=(audio_file,)).start()
+            threading.Thread(target=play_pcm, args=audio).start()
             return True
 
         except Exception as e:
             print(f"Error playing speech: {str(e)}")
             return False
 
-    def speak(self, text):
+    def speak(self, text, on_start=None):
         """
         Add text to the speech queue for processing.
 
         Args:
             text (str): The text to speak
+            on_start (callable, optional): Called from the playback thread when the
+                first audio of this text starts playing
 
         Returns:
             bool: True if added to queue successfully
@@ -145,11 +302,9 @@ class Text2Speech:
         try:
             self._log(f"Adding to speech queue: '{text[:30]}...' ({len(text)} chars)")
 
-            # Check if this text contains a summary marker
-            if "Summary:" in text:
-                self._log("Summary marker detected - will speak only the summary section")
-
-            self.speech_queue.put(text)
+            with self._pending_changed:
+                self._pending += 1
+                self.speech_queue.put((text, self._generation, on_start))
             return True
         except Exception as e:
             self._log(f"Error adding to speech queue: {str(e)}")
@@ -157,38 +312,100 @@ class Text2Speech:
 
     def _process_speech_queue(self):
         """
-        Process the speech queue in a separate thread.
-        This ensures each speech segment plays completely before starting the next.
+        Synthesis stage, runs in a separate thread.
+        Splits queued texts into sentences and synthesizes them on the thread pool, at most
+        `lookahead` chunks ahead of playback.
+        """
+        self._log("Speech synthesis started")
+        while not self.stop_requested:
+            item = self.speech_queue.get()
+            if item is None:  # stop signal from `cleanup`
+                break
+            text, generation, on_start = item
+
+            self._log(f"Synthesizing speech: '{text[:30]}...' ({len(text)} chars)")
+            prepared = self.prepare_text(text)
+            cache = len(prepared) <= self.max_phrase_length
+            chunks = split_sentences(prepared) or [text]
+            for i, chunk in enumerate(chunks):
+                if generation != self._generation:
+                    # Interrupted, the rest of the message is not synthesized
+                    self._finish_item()
+                    break
+                future = self.synthesis_pool.submit(self.render, chunk, cache)
+                # The last chunk marks the end of the message
+                self._put_ready(
+                    (future, i == len(chunks) - 1, generation, on_start if i == 0 else None)
+                )
+            self.speech_queue.task_done()
+
+    def _put_ready(self, item):
+        """Blocks while playback is `lookahead` chunks behind"""
+        if not self.stop_requested:
+            self.ready_queue.put(item)
+
+    def _process_ready_queue(self):
+        """
+        Playback stage, runs in a separate thread.
+        Plays synthesized chunks in order, each starting as soon as the previous one ended.
         """
-        self._log("Speech queue processing started")
+        self._log("Speech playback started")
         while not self.stop_requested:
+            item = self.ready_queue.get()
+            if item is None:  # stop signal from `cleanup`
+                break
+            future, last, generation, on_start = item
+
             try:
-                # Check if there's anything in the queue
-                if not self.speech_queue.empty():
-                    # Get the next text to speak
-                    text = self.speech_queue.get()
-                    self._log(f"Processing speech: '{text[:30]}...' ({len(text)} chars)")
-
-                    # Mark as speaking
-                    self.is_speaking = True
-
-                    # Convert and play
-                    filename = self.convert_to_speech(text)
-                    self._log(f"Playing audio file: {filename}")
-                    play_audio(filename)
-
-                    # Mark task as done
-                    self.speech_queue.task_done()
-                    self.is_speaking = False
-                    self._log("Speech complete")
+                if generation != self._generation:
+                    future.cancel()  # dropped by `interrupt`
                 else:
-                    # No speech to process, sleep a bit to prevent CPU hogging
-                    time.sleep(0.1)
+                    # Waits for the synthesis of this chunk if it is not ready yet
+                    audio, sr = future.result()
+                    self._log(f"Playing {len(audio) / sr:.1f}s of audio")
+                    self._play(audio, sr, generation, on_start)
             except Exception as e:
-                self._log(f"Error in speech queue processing: {str(e)}")
-                # Continue processing the queue even if one item fails
-                self.is_speaking = False
-                time.sleep(0.1)
+                # Continue with the next chunk even if this one fails
+                self._log(f"Error in speech processing: {str(e)}")
+            finally:
+                if last:
+                    self._finish_item()
+                self.ready_queue.task_done()
+
+    def _play(self, audio, sr, generation, on_start=None):
+        handle = PlaybackHandle(audio, sr)
+        with self._playback_lock:
+            # Checked under the lock, so `interrupt` either sees this handle or the
+            # chunk is not played at all
+            if generation != self._generation:
+                return
+            self._playback = handle.start()
+        try:
+            if on_start is not None:
+                on_start()
+            handle.wait()
+        finally:
+            with self._playback_lock:
+                self._playback = None
+
+    def interrupt(self):
+        """
+        Stop the speech that is playing and drop all queued speech, including chunks
+        that were already synthesized. Used when the user starts talking over the
+        assistant.
+
+        Returns:
+            bool: True if there was speech to interrupt
+        """
+        with self._pending_changed:
+            speaking = self._pending > 0
+            self._generation += 1
+        with self._playback_lock:
+            if self._playback is not None:
+                self._playback.cancel()
+        if speaking:
+            self._log("Speech interrupted")
+        return speaking
 
     def wait_until_done(self, timeout=None):
         """
@@ -200,39 +417,57 @@ class Text2Speech:
         Returns:
             bool: True if all speech completed, False if timed out
         """
-        if timeout:
-            end_time = time.time() + timeout
-            while not self.speech_queue.empty() or self.is_speaking:
-                if time.time() > end_time:
-                    return False
-                time.sleep(0.1)
-            return True
-        else:
-            # Wait indefinitely
-            while not self.speech_queue.empty() or self.is_speaking:
-                time.sleep(0.1)
-            return True
+        # Woken up by the playback thread as soon as the last item finishes
+        with self._pending_changed:
+            return self._pending_changed.wait_for(
+                lambda: self._pending == 0, timeout=timeout
+            )
+
+    def _finish_item(self):
+        with self._pending_changed:
+            self._pending -= 1
+            idle = self._pending == 0
+            self._pending_changed.notify_all()
+        self._log("Speech complete")
+        if idle and self.on_idle is not None:
+            self.on_idle()
+
+    @staticmethod
+    def _drain(q):
+        """Remove all items from a queue without blocking"""
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                return
 
     def cleanup(self):
         """
-        Stop the speech thread and remove all temporary audio files.
+        Stop the speech threads and release the audio kept in memory.
         """
-        # Signal the thread to stop
+        # Signal the threads to stop, waking them up if they are waiting for work
         self.stop_requested = True
-
-        # Wait for the thread to finish (with timeout)
-        if hasattr(self, 'speech_thread') and self.speech_thread.is_alive():
-            self.speech_thread.join(timeout=2.0)
-
-        for file in self.audio_files:
+        self.interrupt()
+        self.speech_queue.put(None)
+        while True:
+            self._drain(self.ready_queue)
             try:
-                if os.path.exists(file):
-                    os.remove(file)
-            except Exception as e:
-                print(f"Error cleaning up file {file}: {str(e)}")
+                self.ready_queue.put_nowait(None)
+                break
+            except queue.Full:
+                continue  # the synthesis thread added a chunk in the meantime
+
+        # Whatever was still queued will not be played
+        with self._pending_changed:
+            self._pending = 0
+            self._pending_changed.notify_all()
+
+        # Wait for the threads to finish (with timeout)
+        for thread in (self.synthesis_thread, self.playback_thread):
+            if thread.is_alive():
+                thread.join(timeout=2.0)
+        self.synthesis_pool.shutdown(wait=False, cancel_futures=True)
 
-        # Clear the list after cleanup
-        self.audio_files = []
         self.current_audio = None
 
 
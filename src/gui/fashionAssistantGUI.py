@@ -1,30 +1,57 @@
 import tkinter as tk
-import uuid
 from tkinter import scrolledtext, filedialog, messagebox
 from PIL import Image, ImageTk
 import threading
 import io
 import base64
+import itertools
+import logging
 import time
-import sounddevice as sd
-import wavio
-import os
+from dataclasses import replace
 
 # Import your existing components
 from src.agent.controller.controller import Controller
 from src.agent.asr.asr import ASR
-from src.agent.memory.memory import Memory
+from src.agent.asr.capture import (
+    BARGE_IN_THRESHOLD,
+    CaptureService,
+    Endpointing,
+    LONG_ANSWER,
+    SHORT_ANSWER,
+)
+from src.agent.memory.memory import Memory, DEFAULT_SNAPSHOT_DIR
+from src.agent.memory.store import SQLiteStore
+from src.agent.memory.retrieval import check_ollama, embed_context
 from src.agent.emotion.linguistic import LinguisticSystem
 from src.agent.emotion.emotion import EmotionSystem
 from src.agent.generator.generator import Generator
-from src.agent.controller.controller import ConversationPhase
+from src.agent.generator.outfit import OutfitStream
+from src.agent.generator.cache import ResponseCache
+from src.agent.controller.controller import (
+    ConversationPhase,
+    FIXED_PROMPTS,
+    parse_choice,
+)
 
 # Import our new Text2Speech class
 from src.agent.text2speech.text2speech import Text2Speech
 
+# Latency and routing metrics, shown with `main.py --verbose`
+logger = logging.getLogger(__name__)
+
+
+class WindowClosed(Exception):
+    """Raised on the conversation thread when the window is closed while it waits"""
+
 
 class FashionAssistantGUI:
-    def __init__(self, root, long_term_retrieval: bool = True):
+    def __init__(
+        self,
+        root,
+        long_term_retrieval: bool = True,
+        response_cache: bool = False,
+        candidates: int = 1,
+    ):
         self.root = root
         self.root.title("Fashion Assistant")
         self.root.geometry(
@@ -36,29 +63,118 @@ class FashionAssistantGUI:
         self.conversation_active = False
         self.listening = False
 
+        # Set by the GUI thread once the user typed or spoke a response
+        self.input_ready = threading.Event()
+        self.last_input = None
+        # Set once the window is closed, ends the conversation thread
+        self.closed = threading.Event()
+        # Set to stop listening for the user talking over the assistant
+        self.barge_in = None
+        # Counts the questions asked, recordings for an answered question are dropped
+        self.question = 0
+        # Counts the outfits suggested, images of earlier suggestions are dropped
+        self.suggestion = 0
+
         self.initialize_components()
         self.setup_layout()
 
-        self.tts = Text2Speech(lang="en")
+        # TTS Settings
+        self.enable_tts = True
+        self.setup_tts_controls()
+
+        # The agent components take seconds to load, so they are loaded in the background
+        # while the window is already shown. Input is enabled once they are ready.
+        self.long_term_retrieval = long_term_retrieval
+        self.use_response_cache = response_cache
+        self.candidates = candidates  # outfits proposed at once, see `show_gallery`
+        self.tts = None
+        self.memory = None
+        self.capture = None
+        self.controller = None
+        self.set_input_enabled(False)
+        threading.Thread(target=self.load_components, daemon=True).start()
+
+    def load_components(self):
+        """Load the agent components in a fixed order, showing progress in the status bar"""
+        steps = [
+            ("text-to-speech", "tts", self._create_tts),
+            ("memory", "memory", self._create_memory),
+            ("outfit generator", "generator", self._create_generator),
+            ("emotion model", "emotion", EmotionSystem),
+            ("speech recognition", "asr", lambda: ASR(model_name="base")),
+            ("microphone", "capture", self._open_microphone),
+        ]
+        for i, (name, attribute, create) in enumerate(steps):
+            self.root.after(
+                0, self.update_status, f"Loading {name} ({i + 1}/{len(steps)})..."
+            )
+            try:
+                setattr(self, attribute, create())
+            except Exception as e:
+                self.root.after(0, self.display_system_message, f"Failed to load {name}: {e}")
+                self.root.after(0, self.update_status, "Startup failed")
+                return
 
-        # Initialize agent components
-        self.asr = ASR(model_name="base")
-        self.memory = Memory(long_term_retrieval=long_term_retrieval)
-        self.emotion = EmotionSystem()
-        self.generator = Generator()
         self.controller = Controller(
             asr=self.asr,
             memory=self.memory,
             emotion=self.emotion,
             generator=self.generator,
+            capture=self.capture,
+            candidates=self.candidates,
         )
 
         # Override controller methods
         self.override_controller_methods()
+        self.root.after(0, self._on_components_loaded)
+
+    def _open_microphone(self):
+        # Kept open for the whole session, so recordings can include a pre-roll
+        capture = CaptureService()
+        capture.start()
+        return capture
+
+    def _create_tts(self):
+        tts = Text2Speech(lang="en", on_idle=self._on_speech_idle)
+        # Render the fixed prompts while the other components are loading
+        tts.prerender(
+            FIXED_PROMPTS
+            + ("Here is a recommendation for you. Give me a second please.",)
+        )
+        return tts
 
-        # TTS Settings
-        self.enable_tts = True
-        self.setup_tts_controls()
+    def _create_memory(self):
+        memory = Memory(
+            long_term_retrieval=self.long_term_retrieval,
+            store=SQLiteStore(),
+            snapshot_dir=DEFAULT_SNAPSHOT_DIR,
+        )
+        # Without the embedding server, fall back to the preferences of the current conversation
+        if memory.long_term_retrieval and not check_ollama():
+            memory.long_term_retrieval = False
+            self.root.after(
+                0,
+                self.display_system_message,
+                "Ollama is not running, long-term memory retrieval is disabled.",
+            )
+        return memory
+
+    def _create_generator(self):
+        # The response cache matches contexts by their embedding, which needs Ollama
+        response_cache = None
+        if self.use_response_cache and self.memory.long_term_retrieval:
+            response_cache = ResponseCache(embed=embed_context)
+        return Generator(response_cache=response_cache)
+
+    def _on_components_loaded(self):
+        self.set_input_enabled(True)
+        self.update_status("Ready")
+        self.display_system_message("Press 'New Conversation' to start.")
+
+    def set_input_enabled(self, enabled):
+        state = tk.NORMAL if enabled else tk.DISABLED
+        for button in (self.send_button, self.speak_button, self.new_convo_button):
+            button.config(state=state)
 
     def initialize_components(self):
         self.main_container = tk.Frame(self.root, bg="#f0f0f0")
@@ -132,6 +248,7 @@ class FashionAssistantGUI:
         # Image display area
         self.image_frame = tk.Frame(self.right_frame, bg="#f0f0f0")
         self.image_label = tk.Label(self.image_frame, bg="#f0f0f0")
+        self.gallery_frame = None  # replaces the image label while candidates are shown
 
         # Status bar
         self.status_bar = tk.Label(
@@ -243,26 +360,15 @@ class FashionAssistantGUI:
 
         def new_speak(message):
             # Display message in UI
-            text_without_summary = message
-            only_summary = message
-            if "Summary:" in message:
-                text_without_summary = message.split("Summary:")[0]
-                only_summary = message.split("Summary:")[1]
-
-            self.display_assistant_message(text_without_summary)
+            self.display_assistant_message(message)
 
             # Use TTS if enabled
             if self.enable_tts:
                 self.update_status("Speaking...")
                 try:
-                    # Add message to the speech queue
-                    self.tts.speak(only_summary)
-
-                    # We no longer need to create a new thread here since the queue
-                    # is already being processed in a background thread
-
-                    # Update UI status - this will be updated to Ready when speech finishes
-                    self.root.after(100, self._check_speech_status)
+                    # Add message to the speech queue, the status is set back to
+                    # Ready by `_on_speech_idle` once everything has been spoken
+                    self.tts.speak(message)
                 except Exception as e:
                     self.display_system_message(f"TTS Error: {str(e)}")
                     self.update_status("Ready")
@@ -275,12 +381,12 @@ class FashionAssistantGUI:
         # Override controller's listen method
         original_listen = self.controller.listen
 
-        def new_listen(prompt=""):
+        def new_listen(prompt="", endpointing=Endpointing()):
             """
             Modified listen method that waits for either text input or speak button press
             """
             # Reset input state
-            self.waiting_for_input = True
+            self.input_ready.clear()
             self.last_input = None
             self.last_emotion="neutral"
 
@@ -289,16 +395,27 @@ class FashionAssistantGUI:
                 "Please type your response or press 'Speak' to use voice input."
             )
             self.update_status("Waiting for input...")
-            self.speak_button.config(command = lambda: self.toggle_listening(prompt))
-
-            # Wait for either text input or voice input to complete
-            while self.waiting_for_input:
-                self.root.update()
-                time.sleep(0.1)
+            self.speak_button.config(
+                command=lambda: self.toggle_listening(prompt, endpointing)
+            )
 
-                # Exit the loop if input has been provided
-                if self.last_input is not None:
-                    break
+            # While the question is still being spoken, the user can already answer
+            if self.enable_tts and self.tts.is_speaking:
+                threading.Thread(
+                    target=self.listen_during_speech,
+                    args=(prompt, endpointing),
+                    daemon=True,
+                ).start()
+
+            # Wait for either text input or voice input to complete. This runs on the
+            # conversation thread, the Tk main loop keeps handling the GUI meanwhile.
+            self.input_ready.wait()
+            if self.closed.is_set():
+                raise WindowClosed()
+            # However it was answered, stop listening for this question
+            self.question += 1
+            if self.barge_in is not None:
+                self.barge_in.set()
 
             # Get whatever input was provided
             input_text = self.last_input if self.last_input is not None else ""
@@ -334,6 +451,7 @@ class FashionAssistantGUI:
 
                 # Resize image to fit the window
                 image = self.resize_image(image)
+                self.clear_gallery()
 
                 photo = ImageTk.PhotoImage(image)
                 self.image_label.config(image=photo)
@@ -345,12 +463,53 @@ class FashionAssistantGUI:
 
         original_handle_recommending = self.controller.handle_recommending
 
-        def remove_random_characters(text_prompt):
-            # remove the ** from the text
-            text_prompt = text_prompt.replace("**", "")
-            return text_prompt
+        def new_handle_recommending_candidates():
+            self.controller.speak(
+                "Here are some recommendations for you. Give me a second please."
+            )
+            memories = self.controller.memory.retrieve(
+                self.controller.user, self.controller.conversation_index
+            )
+            self.update_memory_display(memories)
+
+            # All outfits come from one completion, their images are fetched concurrently
+            outfits = self.controller.generator.generate_candidates(
+                self.controller.context,
+                self.controller.user_attributes,
+                memories,
+                self.previous_suggestions,
+                n=self.candidates,
+            )
+            images = [
+                self.controller.generator.generate_image_async(outfit)
+                for outfit in outfits
+            ]
+            self.suggestion += 1
+            self.root.after(0, self.show_gallery, images, self.suggestion)
+            for i, outfit in enumerate(outfits):
+                self.display_assistant_message(f"Option {i + 1}: {outfit.summary}")
+
+            self.controller.speak(
+                "Which one do you like best? Click it, or tell me if you like none of them."
+            )
+            response, emotion = self.controller.listen(endpointing=LONG_ANSWER)
+            choice = parse_choice(response, len(outfits))
+            self.controller.add_candidate_preferences(
+                outfits, choice, response, emotion
+            )
+            self.controller.memory.flush_async()
+
+            if choice is None:
+                # Ask for new outfits, different from all of these
+                self.previous_suggestions.extend(outfit.text for outfit in outfits)
+                return ConversationPhase.RECOMMENDING
+            self.controller.speak("Thank you for using our service. Have a nice day!")
+            return ConversationPhase.END
 
         def new_handle_recommending():
+            if self.candidates > 1:
+                return new_handle_recommending_candidates()
+
             self.controller.speak(
                 "Here is a recommendation for you. Give me a second please."
             )
@@ -361,30 +520,83 @@ class FashionAssistantGUI:
             # Update memory display with retrieved memories
             self.update_memory_display(memories)
 
+            # Show the outfit while it is generated, and speak the summary sentence by
+            # sentence as soon as each one is complete
+            start = time.perf_counter()
+
+            def on_first_audio():
+                logger.info("First audio after %.2fs", time.perf_counter() - start)
+
+            def speak_sentences(sentences):
+                nonlocal on_first_audio
+                if not self.enable_tts:
+                    return
+                for sentence in sentences:
+                    self.update_status("Speaking...")
+                    self.tts.speak(sentence, on_start=on_first_audio)
+                    on_first_audio = None
+
             # Pass previous suggestions to generate
-            text, image = self.controller.generator.generate(
+            stream = OutfitStream()
+            self.begin_assistant_message()
+            for delta in self.controller.generator.generate_text_stream(
                 self.controller.context,
                 self.controller.user_attributes,
                 memories,
                 self.previous_suggestions,
-            )
-            text = remove_random_characters(text)
-            # Store this suggestion for future reference
-            self.previous_suggestions.append(text)
+            ):
+                display, sentences = stream.feed(delta)
+                self.append_assistant_text(display)
+                speak_sentences(sentences)
+            display, sentences = stream.finish()
+            self.append_assistant_text(display)
+            self.end_assistant_message()
+            speak_sentences(sentences)
+            generator = self.controller.generator
+            logger.info("Prompt of ~%s tokens", generator.last_prompt_tokens)
+            if generator.last_route is not None:
+                route = generator.last_route
+                logger.info(
+                    "Generated with %s (%s), %.0f%% of completions fell back",
+                    route.model, route.reason, 100 * generator.router.fallback_rate,
+                )
+            if generator.last_ttft is not None:
+                logger.info("First token after %.2fs", generator.last_ttft)
+            if generator.response_cache is not None:
+                stats = generator.response_cache.stats
+                logger.info(
+                    "Response cache: %.0f%% hit rate, %.1fs of generation saved",
+                    100 * stats["hit_rate"], stats["saved_seconds"],
+                )
 
-            self.controller.speak(text)
-            self.controller.show_image(image)
+            # Parsed once, the parts are used for the prompt, the image and the memory
+            outfit = stream.outfit
+            # Store this suggestion for future reference
+            self.previous_suggestions.append(outfit.text)
+
+            # Fetch the image while the summary is spoken, it is shown once it arrives
+            image = self.controller.generator.generate_image_async(outfit)
+            self.suggestion += 1
+            suggestion = self.suggestion
+            image.add_done_callback(
+                lambda future: self.root.after(
+                    0, self._on_image_ready, future, suggestion
+                )
+            )
 
             self.controller.speak("What do you think?")
-            response, emotion = self.controller.listen()
+            response, emotion = self.controller.listen(endpointing=LONG_ANSWER)
 
-            preference = dict(outfit=text, response=response, emotion=emotion)
+            preference = dict(
+                outfit=outfit.memory_key, response=response, emotion=emotion
+            )
             self.controller.memory.add_preference(
                 self.controller.user, self.controller.conversation_index, preference
             )
 
             self.controller.speak("Are you satisfied with the recommendation?")
-            response, _ = self.controller.listen()
+            response, _ = self.controller.listen(endpointing=SHORT_ANSWER)
+            self.controller.memory.flush_async()
 
             # Make the check case-insensitive by converting to lowercase
             # Also check if 'yes' is in the response, not just equal to 'yes'
@@ -398,6 +610,70 @@ class FashionAssistantGUI:
 
         self.controller.handle_recommending = new_handle_recommending
 
+    def show_gallery(self, images, suggestion=None):
+        """Show candidate outfits side by side, the user picks one by clicking it"""
+        if suggestion is not None and suggestion != self.suggestion:
+            return  # a newer suggestion or conversation replaced these outfits
+        self.clear_gallery()
+        self.image_label.pack_forget()
+        self.gallery_frame = tk.Frame(self.image_frame, bg="#f0f0f0")
+        self.gallery_frame.pack(expand=True)
+        for i, image in enumerate(images):
+            button = tk.Button(
+                self.gallery_frame,
+                text=f"Option {i + 1}\n(loading...)",
+                compound=tk.TOP,
+                command=lambda i=i: self.select_candidate(i),
+            )
+            button.grid(row=i // 2, column=i % 2, padx=2, pady=2)
+            # Filled in as each image arrives
+            image.add_done_callback(
+                lambda future, button=button, i=i: self.root.after(
+                    0, self._show_candidate_image, button, i, future
+                )
+            )
+
+    def _show_candidate_image(self, button, i, future):
+        try:
+            image = future.result()
+        except Exception:
+            image = None
+        if not button.winfo_exists():
+            return  # the gallery was closed in the meantime
+        if image is None:
+            button.config(text=f"Option {i + 1}\n(no image)")
+            return
+        photo = ImageTk.PhotoImage(self.resize_image(image, 180, 200))
+        button.config(image=photo, text=f"Option {i + 1}")
+        button.image = photo  # Keep a reference
+
+    def select_candidate(self, i):
+        """Answer the question which candidate the user likes best"""
+        if self.input_ready.is_set():
+            return
+        self.display_user_message(f"Option {i + 1}")
+        self.last_input = f"option {i + 1}"
+        self.input_ready.set()
+
+    def clear_gallery(self):
+        if self.gallery_frame is None:
+            return
+        self.gallery_frame.destroy()
+        self.gallery_frame = None
+        self.image_label.pack(expand=True)
+
+    def _on_image_ready(self, future, suggestion):
+        """Show a fetched outfit image, runs on the Tk thread"""
+        if suggestion != self.suggestion:
+            return  # the outfit was replaced while its image was fetched
+        try:
+            image = future.result()
+        except Exception as e:
+            self.display_system_message(f"Failed to generate image: {str(e)}")
+            return
+        if image is not None:
+            self.controller.show_image(image)
+
     def resize_image(self, image, max_width=380, max_height=400):
         """Resize image to fit within the side panel while maintaining aspect ratio"""
         width, height = image.size
@@ -415,6 +691,49 @@ class FashionAssistantGUI:
         self.chat_display.config(state=tk.DISABLED)
         self.update_status("Ready")
 
+    def begin_assistant_message(self):
+        """Start a message that is filled in with `append_assistant_text` while it streams"""
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.insert(tk.END, "Assistant: ")
+        self.chat_display.config(state=tk.DISABLED)
+
+    def append_assistant_text(self, text):
+        if not text:
+            return
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.insert(tk.END, text)
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state=tk.DISABLED)
+
+    def end_assistant_message(self):
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.insert(tk.END, "\n\n")
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state=tk.DISABLED)
+
+    def display_partial_transcript(self, text):
+        """Show the live transcript of the current utterance, replacing the previous one"""
+        self.chat_display.config(state=tk.NORMAL)
+        self._delete_partial_transcript()
+        self.chat_display.insert(tk.END, f"You (speaking): {text}\n\n", "partial")
+        self.chat_display.tag_configure(
+            "partial", foreground="#888888", font=("Arial", 10, "italic")
+        )
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state=tk.DISABLED)
+
+    def clear_partial_transcript(self):
+        """Remove the live transcript, once the final transcript is known"""
+        self.chat_display.config(state=tk.NORMAL)
+        self._delete_partial_transcript()
+        self.chat_display.config(state=tk.DISABLED)
+
+    def _delete_partial_transcript(self):
+        # Only the tagged text, messages may have been added after it in the meantime
+        ranges = self.chat_display.tag_ranges("partial")
+        if ranges:
+            self.chat_display.delete(ranges[0], ranges[-1])
+
     def display_user_message(self, message):
         self.chat_display.config(state=tk.NORMAL)
         self.chat_display.insert(tk.END, "You: " + message + "\n\n")
@@ -428,55 +747,93 @@ class FashionAssistantGUI:
             self.display_user_message(message)
             self.user_input.delete(0, tk.END)
             self.last_input = message
-            self.waiting_for_input = False
+            self.input_ready.set()
 
-    def toggle_listening(self, prompt=""):
+    def toggle_listening(self, prompt="", endpointing=Endpointing()):
         """Toggle voice input recording"""
+        if self.barge_in is not None:
+            self.barge_in.set()  # the button takes over from listening during speech
         if not self.listening:
             # Start listening
             self.listening = True
-            # Disable the button while recording to prevent multiple clicks
-            self.speak_button.config(
-                text="Recording...", bg="#F44336", state=tk.DISABLED
-            )
-            self.update_status("Listening...")
+            self._show_recording()
 
             # Start recording in a separate thread
-            threading.Thread(target=self.record_audio, args=(prompt,)).start()
+            threading.Thread(
+                target=self.record_audio,
+                args=(prompt, endpointing, None, self.question),
+                daemon=True,
+            ).start()
         else:
             # This shouldn't happen with the disabled button during recording
             pass
 
-    def record_audio(self, prompt=""):
-        """Record audio and process it with ASR"""
-        try:
-            # Set up recording parameters
-            duration = 5  # seconds
-            fs = 16000  # sample rate
+    def listen_during_speech(self, prompt="", endpointing=Endpointing()):
+        """
+        Listen while the assistant is speaking. If the user starts talking, the speech is
+        interrupted and the utterance is recorded as the response. Stops without recording
+        once the assistant has finished speaking.
+        """
+        question = self.question
+        cancel = threading.Event()
+        self.barge_in = cancel
+        if self.input_ready.is_set() or not self.tts.is_speaking:
+            return  # finished in the meantime
+
+        # Only speech louder than the echo of the assistant counts as an onset
+        blocks = self.capture.utterance_blocks(
+            replace(endpointing, onset_threshold=BARGE_IN_THRESHOLD),
+            on_onset=self.tts.interrupt,
+            cancel=cancel,
+        )
+        first = next(blocks, None)  # blocks until the onset or until cancelled
+        if first is None or self.listening:
+            blocks.close()
+            return
+        self.listening = True
+        self.root.after(0, self._show_recording)
+        self.record_audio(
+            prompt, endpointing, itertools.chain([first], blocks), question
+        )
 
+    def record_audio(
+        self, prompt="", endpointing=Endpointing(), blocks=None, question=None
+    ):
+        """
+        Record audio until the user stops talking and process it with ASR. The result is
+        dropped if `question` has been answered in another way in the meantime.
+        """
+        try:
             # Show recording status
-            self.update_status(f"Recording for {duration} seconds...")
-
-            # Perform the recording
-            recording = sd.rec(int(duration * fs), samplerate=fs, channels=1)
-            sd.wait()  # Wait until recording is finished
-
-            # Create temporary filename
-            # temp_filename = f"{str(uuid.uuid4())}.wav"
-            temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp")
-
-            os.makedirs(temp_dir, exist_ok=True)
-            temp_filename = os.path.join(temp_dir, f"{uuid.uuid4()}.wav")
-
-            wavio.write(temp_filename, recording, fs, sampwidth=2)
-
-            # Transcribe the audio
-            text = self.asr.transcribe(prompt, temp_filename)
+            self.update_status("Listening... recording stops when you pause.")
+
+            # Record until the trailing silence or the maximum duration is reached,
+            # showing partial transcripts while the user is still speaking
+            if blocks is None:
+                blocks = self.capture.utterance_blocks(endpointing)
+            # Partial transcripts arrive on the ASR worker thread, Tk is only used from
+            # the main loop
+            try:
+                text = self.asr.transcribe_stream(
+                    prompt,
+                    blocks,
+                    on_partial=lambda partial: self.root.after(
+                        0, self.display_partial_transcript, partial
+                    ),
+                )
+            finally:
+                self.root.after(0, self.clear_partial_transcript)
+            if question is not None and question != self.question:
+                return  # answered by typing or clicking in the meantime
+            if not text:
+                # E.g. noise that was taken for the user talking over the assistant, the
+                # question stays open rather than being answered with nothing
+                self.display_system_message(
+                    "No speech detected, please type your response or press 'Speak'."
+                )
+                return
             emotion = self.emotion.linguisticSystem.get_emotion(text)
 
-            # Clean up the temporary file
-            os.remove(temp_filename)
-
             # Display the transcription result
             self.display_system_message(f'Voice recognized: "{text}"')
 
@@ -487,35 +844,22 @@ class FashionAssistantGUI:
             # Store the transcription as input and signal that we're done waiting
             self.last_input = text
             self.last_emotion = emotion
-            self.waiting_for_input = False
+            self.input_ready.set()
 
         except Exception as e:
             self.display_system_message(f"Error recording audio: {str(e)}")
+            if question is not None and question != self.question:
+                return
             # Still need to provide something and mark as not waiting
             self.last_input = ""
             self.last_emotion = "neutral"
-            self.waiting_for_input = False
+            self.input_ready.set()
         finally:
             # IMPORTANT: Use root.after to ensure button state is updated in the main thread
             # This ensures the button is properly re-enabled
             self.root.after(0, self._reset_speak_button)
             self.update_status("Ready")
 
-    def start_listening(self):
-        self.update_status("Listening...")
-        # The actual listening happens in the controller's listen method
-        # Add a timeout to prevent indefinite listening
-        timeout = 10  # seconds
-        start_time = time.time()
-
-        while self.listening and time.time() - start_time < timeout:
-            # Check periodically if we're still supposed to be listening
-            time.sleep(0.1)
-
-        # If we're still in listening mode after timeout, automatically stop it
-        if self.listening:
-            self.toggle_listening()
-
     def update_status(self, message):
         self.status_bar.config(text=message)
         self.root.update()
@@ -532,7 +876,9 @@ class FashionAssistantGUI:
         self.chat_display.delete(1.0, tk.END)
         self.chat_display.config(state=tk.DISABLED)
 
-        # Clear image
+        # Clear image, images still being fetched are dropped
+        self.suggestion += 1
+        self.clear_gallery()
         self.image_label.config(image="")
 
         # Clear memory display
@@ -541,46 +887,55 @@ class FashionAssistantGUI:
         # Reset previous suggestions
         self.previous_suggestions = []
 
-        # Clean up existing TTS engine if it exists
-        if hasattr(self, "tts"):
-            self.tts.cleanup()
-
-        # Reinitialize the Text2Speech engine
-        self.tts = Text2Speech(lang="en")
+        # Stop what is still being said, the engine is kept with its prerendered prompts
+        if self.tts is not None:
+            self.tts.interrupt()
 
         # Set conversation state and start new thread
         self.conversation_active = True
-        threading.Thread(target=self.run_conversation).start()
+        threading.Thread(target=self.run_conversation, daemon=True).start()
 
     def run_conversation(self):
         self.update_status("Conversation started")
         self.new_convo_button.config(state=tk.DISABLED)
         try:
             self.controller.start()
+        except WindowClosed:
+            return  # the widgets are gone
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {str(e)}")
         finally:
             self.conversation_active = False
+        if not self.closed.is_set():
             self.new_convo_button.config(state=tk.NORMAL)
             self.update_status("Conversation ended")
             # No TTS cleanup here as it's handled when starting a new conversation
 
+    def _show_recording(self):
+        # Disable the button while recording to prevent multiple clicks
+        self.speak_button.config(text="Recording...", bg="#F44336", state=tk.DISABLED)
+        self.update_status("Listening...")
+
     def _reset_speak_button(self):
         """Helper method to reset the speak button state correctly in the main thread"""
         self.listening = False
         self.speak_button.config(text="Speak", bg="#2196F3", state=tk.NORMAL)
 
-    def _check_speech_status(self):
-        """Check if the TTS engine is still speaking and update the status accordingly"""
-        if hasattr(self, "tts") and self.tts.is_speaking:
-            # Still speaking, check again after a delay
-            self.update_status("Speaking...")
-            self.root.after(500, self._check_speech_status)
-        else:
-            # Done speaking
-            self.update_status("Ready")
+    def _on_speech_idle(self):
+        """Called on the TTS playback thread once all queued speech has been played"""
+        if self.barge_in is not None:
+            self.barge_in.set()
+        self.root.after(0, self.update_status, "Ready")
 
     def on_closing(self):
         """Handle window close event"""
-        self.tts.cleanup()
+        # Release the conversation thread if it is waiting for an answer
+        self.closed.set()
+        self.input_ready.set()
+        if self.tts is not None:
+            self.tts.cleanup()
+        if self.memory is not None:
+            self.memory.close()
+        if self.capture is not None:
+            self.capture.close()
         self.root.destroy()
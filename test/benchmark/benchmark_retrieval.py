@@ -0,0 +1,79 @@
+"""Compare the vectorized context index against the per-conversation retrieval loop it replaced
+
+Run from the repository root with `PYTHONPATH=. python test/benchmark/benchmark_retrieval.py`.
+Embeddings are random unit vectors, so no embedding server is needed and only the ranking
+itself is measured.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.agent.memory.index import ContextIndex
+
+
+def loop_retrieve(embeddings, conversations, conversation_index, top_k=5):
+    """The original retrieval loop, with the embedding calls replaced by a lookup"""
+    current_embedding = embeddings[conversation_index]
+    memories = []
+    context_similarities = []
+    for i, conversation in enumerate(conversations):
+        context_sim = np.dot(current_embedding, embeddings[i])
+        prefs = conversation["preferences"]
+        memories.extend(prefs)
+        context_similarities.extend([context_sim] * len(prefs))
+
+    sorted_indices = np.argsort(context_similarities)[::-1]
+    return [memories[i] for i in sorted_indices[:top_k]]
+
+
+def index_retrieve(index, conversations, conversation_index, top_k=5):
+    ranking = index.top_k(index.embeddings[conversation_index], top_k)
+    return [conversations[c]["preferences"][p] for c, p in ranking]
+
+
+def timeit(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--preferences", type=int, default=4, help="per conversation")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.conversations, args.dim)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    conversations = [
+        dict(preferences=[f"preference {i}.{j}" for j in range(args.preferences)])
+        for i in range(args.conversations)
+    ]
+    index = ContextIndex()
+    for embedding, conversation in zip(embeddings, conversations):
+        index.add_conversation(embedding, len(conversation["preferences"]))
+
+    current = args.conversations - 1
+    loop_time = timeit(
+        lambda: loop_retrieve(embeddings, conversations, current), args.repeats
+    )
+    index_time = timeit(
+        lambda: index_retrieve(index, conversations, current), args.repeats
+    )
+
+    n_preferences = args.conversations * args.preferences
+    print(f"{args.conversations} conversations, {n_preferences} preferences")
+    print(f"loop:  {loop_time * 1000:8.3f} ms")
+    print(f"index: {index_time * 1000:8.3f} ms ({loop_time / index_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
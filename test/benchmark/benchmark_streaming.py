@@ -0,0 +1,127 @@
+"""Compare the perceived latency of blocking and streaming outfit generation
+
+Run from the repository root with `PYTHONPATH=. python test/benchmark/benchmark_streaming.py`.
+A local stand-in for the Mistral API produces a fixed outfit description with artificial
+delays, before the first token and between tokens. Speech synthesis is simulated with a
+fixed delay per sentence, so the time to first audio is the time until the first summary
+sentence is available plus that delay.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.agent.generator.generator import Generator
+from src.agent.generator.outfit import OutfitStream
+
+OUTFIT = json.dumps(
+    dict(
+        top="A crisp white linen shirt with rolled sleeves, relaxed fit.",
+        bottom="Tailored beige chinos in a light cotton twill, cropped at the ankle.",
+        footwear="Tan suede loafers without socks.",
+        accessories="A woven leather belt, tortoiseshell sunglasses and a straw fedora.",
+        suggestion="Tuck the shirt in loosely to keep the look effortless.",
+        summary="A breezy summer outfit with a white linen shirt and beige chinos. Tan suede loafers and a straw fedora finish the relaxed look. Tuck the shirt in loosely for an effortless feel.",
+        image_prompt="white linen shirt, beige chinos, tan suede loafers, straw fedora",
+        memory_key="white linen shirt with beige chinos",
+    )
+)
+
+
+def make_handler(first_token_delay, token_delay):
+    class StubMistral(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            tokens = OUTFIT.split(" ")
+            tokens = [token + " " for token in tokens[:-1]] + tokens[-1:]
+            time.sleep(first_token_delay)
+
+            if not body.get("stream"):
+                time.sleep(token_delay * len(tokens))
+                message = dict(role="assistant", content=OUTFIT)
+                choice = dict(index=0, message=message, finish_reason="stop")
+                usage = dict(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+                data = json.dumps(
+                    dict(id="stub", object="chat.completion", model=body["model"],
+                         created=0, choices=[choice], usage=usage)
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for token in tokens:
+                choice = dict(index=0, delta=dict(content=token), finish_reason=None)
+                chunk = dict(id="stub", model=body["model"], choices=[choice])
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        def log_message(self, *args):
+            pass
+
+    return StubMistral
+
+
+def blocking(generator, synthesis_delay):
+    start = time.perf_counter()
+    generator.generate_text("summer party", {}, [], [])
+    shown = time.perf_counter() - start
+    # Synthesis of the first summary sentence can only start once everything arrived
+    return dict(first_text=shown, first_audio=shown + synthesis_delay, total=shown)
+
+
+def streaming(generator, synthesis_delay):
+    start = time.perf_counter()
+    first_sentence = None
+    stream = OutfitStream()
+    for delta in generator.generate_text_stream("summer party", {}, [], []):
+        _, sentences = stream.feed(delta)
+        if sentences and first_sentence is None:
+            first_sentence = time.perf_counter() - start
+    total = time.perf_counter() - start
+    if first_sentence is None:
+        first_sentence = total
+    return dict(
+        first_text=generator.last_ttft,
+        first_audio=first_sentence + synthesis_delay,
+        total=total,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--first-token-delay", type=float, default=0.5)
+    parser.add_argument("--token-delay", type=float, default=0.03, help="per word")
+    parser.add_argument("--synthesis-delay", type=float, default=0.3, help="per sentence")
+    args = parser.parse_args()
+
+    handler = make_handler(args.first_token_delay, args.token_delay)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    generator = Generator(server_url=f"http://127.0.0.1:{server.server_port}")
+
+    results = [
+        ("blocking", blocking(generator, args.synthesis_delay)),
+        ("streaming", streaming(generator, args.synthesis_delay)),
+    ]
+    server.shutdown()
+
+    print(f"{'':10} {'first text':>11} {'first audio':>12} {'complete':>9}")
+    for name, result in results:
+        print(
+            f"{name:10} {result['first_text']:10.2f}s {result['first_audio']:11.2f}s"
+            f" {result['total']:8.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ class MockController(Controller):
     
     sequence: list[tuple[str, str]] = field(default_factory=list)
 
-    def listen(self):
+    def listen(self, prompt="", endpointing=None):
         if self.sequence:
             response, emotion = self.sequence.pop(0)
             print(f"> {response} ({emotion})")
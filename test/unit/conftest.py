@@ -0,0 +1,112 @@
+"""Local stand-ins for the HTTP services the agent talks to (Mistral, Ollama, images)"""
+
+import json
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+@dataclass(frozen=True)
+class StubRequest:
+    method: str
+    path: str
+    body: object  # decoded JSON body, None for a GET
+    client: tuple  # address of the connection, to observe connection reuse
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Records each request and answers it with the `respond(handler, request)` of its server"""
+
+    def do_GET(self):
+        self._handle(None)
+
+    def do_POST(self):
+        self._handle(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+
+    def _handle(self, body):
+        self.stub_request = StubRequest(self.command, self.path, body, self.client_address)
+        self.server.requests.append(self.stub_request)
+        try:
+            self.server.respond(self, self.stub_request)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up, e.g. after its timeout
+
+    def reply(self, status, data, content_type="application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def reply_json(self, payload, status=200):
+        self.reply(status, json.dumps(payload).encode(), "application/json")
+
+    def reply_events(self, payloads):
+        """Server-sent events, one per payload, as the streaming APIs send them"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for payload in payloads:
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def reply_completion(self, content):
+        """A Mistral chat completion, streamed in the given pieces if it was requested so"""
+        model = self.stub_request.body["model"]
+        if self.stub_request.body.get("stream"):
+            pieces = [content] if isinstance(content, str) else content
+            choices = [
+                [dict(index=0, delta=dict(content=piece), finish_reason=None)]
+                for piece in pieces
+            ]
+            return self.reply_events(
+                dict(id="stub", model=model, choices=choice) for choice in choices
+            )
+        if not isinstance(content, str):
+            content = "".join(content)
+        choice = dict(
+            index=0, message=dict(role="assistant", content=content), finish_reason="stop"
+        )
+        usage = dict(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+        self.reply_json(
+            dict(id="stub", object="chat.completion", model=model, created=0,
+                 choices=[choice], usage=usage)
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Starts local servers that answer with `respond(handler, request)`. With `keep_alive`,
+    connections stay open between requests.
+    """
+    servers = []
+
+    def start(respond, keep_alive=False):
+        handler = type(
+            "Handler",
+            (StubHandler,),
+            dict(protocol_version="HTTP/1.1" if keep_alive else "HTTP/1.0"),
+        )
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        server.respond = respond
+        server.requests = []
+        server.url = f"http://127.0.0.1:{server.server_port}"
+        threading.Thread(
+            target=server.serve_forever, args=(0.05,), daemon=True
+        ).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,63 @@
+"""Check that partial transcription never holds up reading the recorded blocks"""
+
+import threading
+import time
+
+import numpy as np
+
+from src.agent.asr.asr import ASR
+
+
+class SlowModel:
+    """Takes longer per pass than the audio it gets is long, like Whisper on a CPU"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lengths = []  # samples of each pass
+        self.threads = set()
+
+    def transcribe(self, audio, initial_prompt=""):
+        self.lengths.append(len(audio))
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        text = f" {len(audio)} samples"
+        return dict(text=text, segments=[dict(end=len(audio) / 16000, text=text)])
+
+
+def live_blocks(n, duration=0.03):
+    """Blocks as they come from the microphone, records how late each one was read"""
+    start = time.perf_counter()
+    for i in range(n):
+        time.sleep(max(0.0, start + i * duration - time.perf_counter()))
+        yield np.zeros(int(duration * 16000), np.float32)
+
+
+def asr_with(model):
+    asr = ASR.__new__(ASR)  # without loading Whisper
+    asr.model = model
+    return asr
+
+
+def test_blocks_are_read_in_real_time():
+    model = SlowModel(delay=0.4)
+    partials = []
+
+    start = time.perf_counter()
+    text = asr_with(model).transcribe_stream(
+        "", live_blocks(50), on_partial=partials.append, interval=0.1
+    )
+    elapsed = time.perf_counter() - start
+
+    # 1.5 s of audio, plus the pass in progress and the final pass
+    assert elapsed < 1.5 + 2 * 0.4 + 0.3
+    # Stale requests were dropped instead of queued, one per interval would be 15
+    assert 1 <= len(partials) < 6
+    assert model.lengths[-1] == 50 * 480  # the final pass covers the whole utterance
+    assert text == f"{50 * 480} samples"
+    assert threading.get_ident() in model.threads  # the final pass runs on the caller
+
+
+def test_empty_recording():
+    model = SlowModel(delay=0.0)
+    assert asr_with(model).transcribe_stream("", iter([])) == ""
+    assert model.lengths == []
@@ -0,0 +1,110 @@
+"""Check that several outfits are requested in one JSON completion and parsed back"""
+
+import json
+
+import pytest
+
+from src.agent.generator.generator import parse_candidates
+from src.agent.generator.outfit import parse_outfit
+
+OUTFITS = [dict(top=f"shirt {i}", summary=f"Outfit {i}.") for i in range(3)]
+
+
+@pytest.fixture
+def server(stub_server):
+    return stub_server(
+        lambda handler, request: handler.reply_completion(json.dumps({"outfits": OUTFITS}))
+    )
+
+
+def test_generate_candidates_in_one_call(server, monkeypatch):
+    from src.agent.generator.generator import Generator
+
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    generator = Generator(server_url=server.url)
+
+    outfits = generator.generate_candidates("party", {}, [], [], n=3)
+    assert [outfit.summary for outfit in outfits] == ["Outfit 0.", "Outfit 1.", "Outfit 2."]
+    assert len(server.requests) == 1
+    body = server.requests[0].body
+    assert body["response_format"] == {"type": "json_object"}
+    assert "Create 3 distinct outfits" in body["messages"][0]["content"]
+
+
+def test_parse_candidates():
+    outfits = parse_candidates('{"outfits": [{"top": "a"}, "Top: b", ""]}')
+    assert [outfit.top for outfit in outfits] == ["a", "b"]
+    # Anything else is taken as a single outfit
+    assert [outfit.top for outfit in parse_candidates("Top: shirt")] == ["shirt"]
+    assert len(parse_candidates('{"outfits": []}')) == 1
+
+
+@pytest.fixture
+def controller():
+    try:
+        from src.agent.controller import controller
+    except OSError:  # sounddevice is installed, but the PortAudio library is not
+        pytest.skip("PortAudio library not found")
+    return controller
+
+
+@pytest.mark.parametrize(
+    "answer, choice",
+    [
+        ("option 2", 1),
+        ("I like the third one", 2),
+        ("Number two please", 1),
+        ("I don't like the second one", None),
+        ("None of them, maybe 2 colours max", None),
+        ("neither", None),
+        ("I like 2 of them", None),
+        ("any one of them", None),
+        ("option 4", None),  # only three options
+        ("2", 1),
+        ("two", 1),
+        ("Two, please", 1),
+        ("3 I think", 2),
+        ("The first one, nothing else comes close", 0),
+        ("Option 2, no doubt", 1),
+        ("the second one is not bad", 1),
+        ("No, the third one", 2),
+        ("Not the first, the second", 1),
+        ("None of them, the second was close though", None),
+        ("I like that one", None),
+        ("5", None),
+    ],
+)
+def test_parse_choice(controller, answer, choice):
+    assert controller.parse_choice(answer, 3) == choice
+
+
+class RecordingMemory:
+    def __init__(self):
+        self.preferences = []
+
+    def add_preference(self, user, conversation_index, preference):
+        self.preferences.append(preference)
+
+
+@pytest.mark.parametrize("choice", [1, None])
+def test_preferences_are_stored_for_every_candidate(controller, choice):
+    memory = RecordingMemory()
+    agent = controller.Controller(
+        memory=memory, emotion=None, asr=None, generator=None, capture=None, candidates=3
+    )
+    outfits = [parse_outfit(json.dumps(outfit)) for outfit in OUTFITS]
+    agent.add_candidate_preferences(outfits, choice, "love the colours", "happy")
+
+    stored = memory.preferences
+    assert [p["outfit"] for p in stored] == [outfit.memory_key for outfit in outfits]
+    if choice is None:
+        assert all(p["response"].startswith("rejected it along with 2") for p in stored)
+        assert all(p["emotion"] == "happy" for p in stored)
+    else:
+        assert stored[1] == dict(
+            outfit="shirt 1",
+            response="picked it over 2 alternatives, love the colours",
+            emotion="happy",
+        )
+        assert stored[0]["response"] == stored[2]["response"] == "preferred option 2 over it"
+        assert stored[0]["emotion"] == "neutral"
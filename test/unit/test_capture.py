@@ -0,0 +1,62 @@
+"""Check that consumers of the capture service do not outlive the audio stream"""
+
+import threading
+
+import pytest
+
+try:
+    from src.agent.asr import capture
+except OSError:  # sounddevice is installed, but the PortAudio library is not
+    pytest.skip("PortAudio library not found", allow_module_level=True)
+
+
+class SilentStream:
+    """Stands in for the microphone stream, delivers no audio"""
+
+    def __init__(self, **kwargs):
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(capture.sd, "InputStream", SilentStream)
+    return capture.CaptureService()
+
+
+def consume(service):
+    blocks = []
+    thread = threading.Thread(
+        target=lambda: blocks.extend(service.utterance_blocks()), daemon=True
+    )
+    thread.start()
+    return thread, blocks
+
+
+def test_close_releases_blocked_consumer(service):
+    thread, blocks = consume(service)
+    thread.join(timeout=0.2)
+    assert thread.is_alive()  # waiting for audio
+
+    service.close()
+    thread.join(timeout=2.0)
+    assert not thread.is_alive()
+    assert blocks == []
+    assert list(service.utterance_blocks()) == []  # the microphone is not reopened
+
+
+def test_stopped_stream_releases_consumer(service):
+    thread, _ = consume(service)
+    thread.join(timeout=0.2)
+    service._stream.active = False  # the device went away
+
+    thread.join(timeout=2.0)
+    assert not thread.is_alive()
@@ -0,0 +1,155 @@
+"""Check that context index snapshots map back to the same ranking, and that stale rows are dropped"""
+
+import numpy as np
+import pytest
+
+from src.agent.memory.index import ContextIndex
+from src.agent.memory.retrieval import context_key, validate_index
+
+MODEL = "all-minilm:latest"
+
+
+def conversation(occasion, n_preferences):
+    context = dict(occasion=occasion, weather="sunny", style="casual")
+    preferences = [
+        dict(outfit=f"{occasion} outfit {i}", response="ok", emotion="neutral")
+        for i in range(n_preferences)
+    ]
+    return dict(context=context, preferences=preferences)
+
+
+@pytest.fixture
+def conversations():
+    return [conversation(occasion, n) for occasion, n in
+            [("wedding", 2), ("hiking", 1), ("office", 3), ("beach", 2)]]
+
+
+@pytest.fixture
+def index(conversations):
+    rng = np.random.default_rng(0)
+    index = ContextIndex()
+    for c in conversations:
+        index.add_conversation(
+            rng.normal(size=8), len(c["preferences"]), key=context_key(c["context"])
+        )
+    return index
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "index.snapshot")
+
+
+def test_snapshot_round_trip(index, path):
+    query = index.embeddings[1].copy()
+    index.save(path, MODEL)
+    assert not index.modified
+
+    loaded = ContextIndex.load(path, MODEL)
+    assert isinstance(loaded.embeddings, np.memmap)
+    assert loaded.size == index.size and loaded.dim == index.dim
+    np.testing.assert_array_equal(loaded.embeddings, index.embeddings)
+    np.testing.assert_array_equal(loaded.keys, index.keys)
+    np.testing.assert_array_equal(loaded.counts, index.counts)
+    assert loaded.top_k(query, 5) == index.top_k(query, 5)
+
+
+def test_snapshot_grows_after_load(index, path):
+    index.save(path, MODEL)
+    loaded = ContextIndex.load(path, MODEL)
+    row = loaded.add_conversation(np.ones(8), 1, key=7)
+
+    assert row == index.size and loaded.modified
+    assert not isinstance(loaded.embeddings, np.memmap)
+    np.testing.assert_array_equal(loaded.embeddings[:row], index.embeddings)
+    # The snapshot itself is unchanged until saved again
+    assert ContextIndex.load(path, MODEL).size == index.size
+
+
+def test_empty_snapshot(path):
+    ContextIndex(dim=8).save(path, MODEL)
+    loaded = ContextIndex.load(path, MODEL)
+    assert loaded.size == 0
+    assert loaded.top_k(np.ones(8), 3) == []
+
+
+def test_snapshot_of_other_model_is_ignored(index, path):
+    index.save(path, MODEL)
+    assert ContextIndex.load(path, "nomic-embed-text") is None
+
+
+@pytest.mark.parametrize("content", [b"", b"not a snapshot", b"CTXIDX\x10\x00"])
+def test_unreadable_snapshot_is_ignored(path, content):
+    with open(path, "wb") as f:
+        f.write(content)
+    assert ContextIndex.load(path, MODEL) is None
+
+
+def test_missing_snapshot_is_ignored(path):
+    assert ContextIndex.load(path, MODEL) is None
+
+
+def test_truncated_snapshot_is_ignored(index, path):
+    index.save(path, MODEL)
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 16)
+    assert ContextIndex.load(path, MODEL) is None
+
+
+def test_stale_snapshot_is_truncated(index, conversations, path):
+    index.save(path, MODEL)
+    conversations[2] = conversation("party", 1)  # context changed since the snapshot
+    conversations[0]["preferences"].append(conversations[1]["preferences"][0])
+
+    loaded = validate_index(ContextIndex.load(path, MODEL), conversations)
+    assert loaded.size == 2 and loaded.modified
+    np.testing.assert_array_equal(loaded.counts, [3, 1])
+    np.testing.assert_array_equal(loaded.embeddings, index.embeddings[:2])
+
+
+def test_snapshot_longer_than_conversations(index, conversations, path):
+    index.save(path, MODEL)
+    loaded = validate_index(ContextIndex.load(path, MODEL), conversations[:3])
+    assert loaded.size == 3
+    ranking = loaded.top_k(index.embeddings[0], 10)
+    assert len(ranking) == 6 and all(c < 3 for c, _ in ranking)
+
+
+def test_current_snapshot_is_unmodified(index, conversations, path):
+    index.save(path, MODEL)
+    loaded = validate_index(ContextIndex.load(path, MODEL), conversations)
+    assert loaded.size == index.size and not loaded.modified
+
+
+def reference_top_k(embeddings, counts, query, k):
+    """The retrieval loop the index replaced: most similar first, then most recent"""
+    scores = []
+    for embedding, count in zip(embeddings, counts):
+        scores += [float(np.dot(embedding, query))] * int(count)
+    order = np.argsort(scores, kind="stable")[::-1][:k]
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    conversations = np.searchsorted(offsets, order, side="right") - 1
+    return [(int(c), int(p - offsets[c])) for c, p in zip(conversations, order)]
+
+
+@pytest.mark.parametrize("k", [1, 5, 11, 12, 20])
+def test_tied_scores_prefer_recent(k):
+    index = ContextIndex()
+    for _ in range(12):
+        index.add_conversation(np.ones(4), 1)
+    expected = [(c, 0) for c in range(11, 11 - min(k, 12), -1)]
+    assert index.top_k(np.ones(4) / 2, k) == expected
+
+
+@pytest.mark.parametrize("k", [1, 3, 7, 30])
+def test_top_k_matches_reference(k):
+    # Few distinct contexts, so that many preferences tie
+    rng = np.random.default_rng(1)
+    contexts = rng.normal(size=(3, 8))
+    index = ContextIndex()
+    for i in range(10):
+        index.add_conversation(contexts[i % 3], int(rng.integers(0, 4)))
+    query = index.embeddings[4]
+    assert index.top_k(query, k) == reference_top_k(
+        index.embeddings, index.counts, query, k
+    )
@@ -0,0 +1,70 @@
+"""Check that retrieval batches its embedding requests, against a local stand-in for Ollama"""
+
+import numpy as np
+import pytest
+
+
+def ollama(handler, request):
+    """Answers /api/embed with deterministic unit vectors"""
+    inputs = request.body["input"]
+    inputs = inputs if isinstance(inputs, list) else [inputs]
+    embeddings = []
+    for text in inputs:
+        rng = np.random.default_rng(abs(hash(text)) % 2**32)
+        embedding = rng.standard_normal(16)
+        embeddings.append((embedding / np.linalg.norm(embedding)).tolist())
+    handler.reply_json({"model": request.body["model"], "embeddings": embeddings})
+
+
+def batches(server):
+    """The inputs of each embedding request"""
+    return [
+        request.body["input"] if isinstance(request.body["input"], list)
+        else [request.body["input"]]
+        for request in server.requests
+    ]
+
+
+@pytest.fixture
+def server(stub_server, monkeypatch):
+    server = stub_server(ollama)
+    monkeypatch.setenv("OLLAMA_HOST", server.url)
+    return server
+
+
+@pytest.fixture
+def retrieval(server, tmp_path, monkeypatch):
+    from src.agent.memory import retrieval
+    from src.agent.memory.embedding_cache import EmbeddingCache
+
+    monkeypatch.setattr(retrieval, "embedding_cache", EmbeddingCache(str(tmp_path)))
+    return retrieval
+
+
+def contexts(n):
+    return [dict(occasion=f"party {i}", weather="sunny", style="casual") for i in range(n)]
+
+
+def test_embed_contexts_batches_requests(retrieval, server):
+    import ollama
+
+    client = ollama.Client(host=server.url)
+    embeddings = retrieval.embed_contexts(contexts(150), batch_size=64, client=client)
+
+    assert embeddings.shape == (150, 16)
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1, rtol=1e-3)
+    assert [len(batch) for batch in batches(server)] == [64, 64, 22]
+
+
+def test_embed_contexts_only_sends_uncached(retrieval, server):
+    import ollama
+
+    client = ollama.Client(host=server.url)
+    first = retrieval.embed_contexts(contexts(100), batch_size=64, client=client)
+    server.requests.clear()
+
+    second = retrieval.embed_contexts(contexts(101), batch_size=64, client=client)
+
+    assert np.allclose(first, second[:100])
+    assert batches(server) == [[retrieval.context_text(contexts(101)[100])]]
+    assert retrieval.embedding_cache.stats["memory_hits"] == 100
@@ -0,0 +1,98 @@
+"""Check the streaming completion path against a local stand-in for the Mistral API"""
+
+import json
+
+import pytest
+
+from src.agent.generator.outfit import OutfitStream
+
+OUTFIT = json.dumps(
+    dict(
+        top="White \"linen\" shirt",
+        bottom="Beige chinos",
+        summary="A light linen outfit. Beige chinos keep it relaxed! Add loafers.",
+        image_prompt="white linen shirt, beige chinos",
+        memory_key="linen shirt with chinos",
+    )
+)
+
+
+def stream_outfit(handler, request):
+    """Streams the outfit a few characters per event"""
+    assert request.body["stream"] is True
+    assert request.body["response_format"] == {"type": "json_object"}
+    handler.reply_completion([OUTFIT[i : i + 7] for i in range(0, len(OUTFIT), 7)])
+
+
+@pytest.fixture
+def server_url(stub_server):
+    return stub_server(stream_outfit).url
+
+
+def test_generate_text_stream(server_url, monkeypatch):
+    from src.agent.generator.generator import Generator
+
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    generator = Generator(server_url=server_url)
+    pieces = list(generator.generate_text_stream("party", {}, [], []))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == OUTFIT
+    assert generator.last_ttft is not None
+
+
+def test_outfit_stream_splits_display_and_summary():
+    stream = OutfitStream()
+    displayed, spoken = "", []
+    for i in range(0, len(OUTFIT), 3):
+        display, sentences = stream.feed(OUTFIT[i : i + 3])
+        displayed += display
+        spoken += sentences
+        # Summary sentences are released before the stream ends
+        received = OUTFIT[: i + 3]
+        if "relaxed! " in received:
+            assert spoken[:2] == ["A light linen outfit.", "Beige chinos keep it relaxed!"]
+        # and the last one as soon as the summary field is complete
+        if 'loafers."' in received:
+            assert spoken[-1] == "Add loafers."
+    display, sentences = stream.finish()
+
+    assert displayed + display == '1. Top: White "linen" shirt\n2. Bottom: Beige chinos'
+    assert spoken + sentences == [
+        "A light linen outfit.",
+        "Beige chinos keep it relaxed!",
+        "Add loafers.",
+    ]
+    assert stream.outfit.memory_key == "linen shirt with chinos"
+
+
+def test_outfit_stream_without_json_shows_everything_at_the_end():
+    stream = OutfitStream()
+    display, sentences = stream.feed("1. Top: Linen shirt\nSummary: A plain outfit.")
+    assert (display, sentences) == ("", [])
+    rest, sentences = stream.finish()
+    assert rest.startswith("1. Top: Linen shirt\n2. Bottom: ")
+    assert sentences == ["A plain outfit."]
+
+
+def test_outfit_stream_shows_sections_that_are_not_strings():
+    answer = json.dumps(
+        dict(
+            top="Linen shirt",
+            accessories=["belt", "straw \"panama\" hat, wide"],
+            suggestion="Roll the sleeves",
+            summary="A light outfit.",
+        )
+    )
+    stream = OutfitStream()
+    displayed, spoken = "", []
+    for i in range(0, len(answer), 5):
+        display, sentences = stream.feed(answer[i : i + 5])
+        displayed += display
+        spoken += sentences
+    rest, sentences = stream.finish()
+
+    # The list is skipped while streaming, without confusing the fields after it
+    assert displayed == "1. Top: Linen shirt\n5. Suggestions: Roll the sleeves"
+    assert rest == '\n4. Accessories: belt, straw "panama" hat, wide'
+    assert spoken + sentences == ["A light outfit."]
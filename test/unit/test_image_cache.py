@@ -0,0 +1,87 @@
+"""Check that generated images are cached by prompt and that the cache stays bounded"""
+
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from src.agent.generator.cache import ImageCache
+from src.agent.generator.outfit import parse_outfit
+
+OUTFIT = parse_outfit(
+    '{"top": "White linen shirt", "summary": "A light outfit.", '
+    '"image_prompt": "white linen shirt & beige chinos"}'
+)
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_key_normalizes_prompt():
+    assert ImageCache.key("A  red\nDress", width=1) == ImageCache.key("a red dress", width=1)
+    assert ImageCache.key("a red dress", width=1) != ImageCache.key("a red dress", width=2)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ImageCache(str(tmp_path), max_entries=2)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put_async(key, b"data").result()
+        # Distinct modification times, the lookup of "a" makes it the most recent
+        os.utime(cache._path(key), (i, i))
+        if key == "b":
+            assert cache.get("a") == b"data"
+    cache.close()
+
+    assert cache.get("a") == b"data"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"data"
+
+
+@pytest.fixture
+def generator(tmp_path, monkeypatch):
+    from src.agent.generator.generator import Generator
+
+    generator = Generator()
+    generator.image_cache = ImageCache(str(tmp_path))
+    downloads = []
+
+    def get(url):
+        downloads.append(url)
+        return png_bytes((len(downloads) * 50, 0, 0))
+
+    monkeypatch.setattr(generator.image_client, "get", get)
+    generator.downloads = downloads
+    return generator
+
+
+def test_generate_image_reads_cache(generator):
+    first = generator.generate_image(OUTFIT)
+    generator.image_cache.close()  # wait for the background write
+    second = generator.generate_image(OUTFIT)
+
+    assert len(generator.downloads) == 1
+    # Only the compact image prompt is sent, fully URL encoded
+    assert "white%20linen%20shirt%20%26%20beige%20chinos?" in generator.downloads[0]
+    assert "summary" not in generator.downloads[0].lower()
+    assert first.tobytes() == second.tobytes()
+    assert generator.image_cache.stats["hits"] == 1
+
+
+def test_fresh_image_bypasses_cache(generator):
+    generator.generate_image(OUTFIT)
+    fresh = generator.generate_image(OUTFIT, fresh=True)
+
+    assert len(generator.downloads) == 2
+    assert fresh.getpixel((0, 0)) == (100, 0, 0)
+
+
+@pytest.mark.parametrize("content", [b"<html>busy</html>", png_bytes("red")[:40]])
+def test_broken_image_is_not_cached(generator, monkeypatch, content):
+    monkeypatch.setattr(generator.image_client, "get", lambda url: content)
+    assert generator.generate_image(OUTFIT) is None
+    generator.image_cache.close()  # wait for any background write
+    assert os.listdir(generator.image_cache.cache_dir) == []
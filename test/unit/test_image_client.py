@@ -0,0 +1,97 @@
+"""Check timeouts, retries and size limits of the image client against a local stub server"""
+
+import time
+
+import pytest
+
+from src.agent.generator.image_client import ImageClient, ImageFetchError
+
+
+def images(handler, request):
+    """
+    /ok returns an image, /flaky/<n> fails n times with 503 before succeeding,
+    /slow stalls before answering, /large returns more data than the limit and
+    /truncated/<n> closes the connection mid-body n times before succeeding.
+    """
+    if request.path.startswith("/flaky/"):
+        if hits(handler.server, request.path) <= int(request.path.split("/")[-1]):
+            return handler.reply(503, b"busy")
+    elif request.path == "/slow":
+        time.sleep(1.0)
+    elif request.path == "/large":
+        return handler.reply(200, b"x" * 4096)
+    elif request.path.startswith("/truncated/"):
+        if hits(handler.server, request.path) <= int(request.path.split("/")[-1]):
+            handler.send_response(200)
+            handler.send_header("Content-Length", "100")
+            handler.end_headers()
+            handler.wfile.write(b"imag")
+            handler.close_connection = True
+            return
+    handler.reply(200, b"image")
+
+
+def hits(server, path):
+    return sum(request.path == path for request in server.requests)
+
+
+@pytest.fixture
+def server(stub_server):
+    # Connections are kept open, so their reuse can be observed
+    return stub_server(images, keep_alive=True)
+
+
+@pytest.fixture
+def client():
+    client = ImageClient(read_timeout=0.3, retries=2, backoff=0.01, max_bytes=1024)
+    yield client
+    client.close()
+
+
+def test_reuses_connections(client, server):
+    for _ in range(3):
+        assert client.get(f"{server.url}/ok") == b"image"
+    assert len({request.client for request in server.requests}) == 1
+    assert client.stats["requests"] == 3
+
+
+def test_retries_failures(client, server):
+    assert client.get(f"{server.url}/flaky/2") == b"image"
+    assert hits(server, "/flaky/2") == 3
+    assert client.timings[-1].attempts == 3
+    assert client.stats["retries"] == 2
+
+
+def test_gives_up_after_retries(client, server):
+    with pytest.raises(ImageFetchError):
+        client.get(f"{server.url}/flaky/5")
+    assert hits(server, "/flaky/5") == 3
+    assert client.timings[-1].status == 503
+
+
+def test_read_timeout(client, server):
+    start = time.perf_counter()
+    with pytest.raises(ImageFetchError):
+        client.get(f"{server.url}/slow")
+    # Three attempts of 0.3 s each, instead of waiting for the server
+    assert time.perf_counter() - start < 2.0
+    assert client.stats["failures"] == 1
+
+
+def test_rejects_large_responses(client, server):
+    with pytest.raises(ImageFetchError):
+        client.get(f"{server.url}/large")
+    assert hits(server, "/large") == 1  # not retried
+
+
+def test_retries_truncated_responses(client, server):
+    assert client.get(f"{server.url}/truncated/1") == b"image"
+    assert hits(server, "/truncated/1") == 2
+    assert client.stats["retries"] == 1
+
+
+def test_gives_up_on_truncated_responses(client, server):
+    with pytest.raises(ImageFetchError):
+        client.get(f"{server.url}/truncated/5")
+    assert hits(server, "/truncated/5") == 3
+    assert client.stats == dict(client.stats, requests=1, failures=1, retries=2)
@@ -0,0 +1,82 @@
+"""Check that memory survives a restart through the SQLite store, loading users lazily"""
+
+import pytest
+
+from src.agent.memory.memory import Memory
+from src.agent.memory.store import SQLiteStore
+
+CONTEXT = dict(occasion="wedding", weather="sunny", style="elegant")
+
+
+def user(name):
+    return dict(name=name, gender="female", height="170", body_type="slim", conversations=[])
+
+
+def preference(outfit):
+    return dict(outfit=outfit, response="love it", emotion="happy")
+
+
+def attributes(user):
+    return {k: v for k, v in user.items() if k != "conversations"}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "memory.db")
+
+
+def test_store_round_trip(path):
+    store = SQLiteStore(path)
+    stored = user("ada")
+    stored["conversations"] = [dict(context=CONTEXT, preferences=[preference("red dress")])]
+    store.create_user(stored)
+    store.create_conversation("ada", 1, dict(CONTEXT, occasion="party"))
+    store.add_preferences([("ada", 1, preference("jeans")), ("ada", 0, preference("hat"))])
+    store.close()
+
+    store = SQLiteStore(path)
+    loaded = store.load_user("ada")
+    store.close()
+
+    assert [p["outfit"] for p in loaded["conversations"][0]["preferences"]] == [
+        "red dress",
+        "hat",
+    ]
+    assert loaded["conversations"][1]["context"]["occasion"] == "party"
+    assert loaded["conversations"][1]["preferences"] == [preference("jeans")]
+    assert attributes(loaded) == attributes(user("ada"))
+
+
+def test_preferences_are_written_on_flush(path):
+    memory = Memory(long_term_retrieval=False, store=SQLiteStore(path))
+    memory.create_user(user("ada"))
+    index = memory.create_conversation("ada", CONTEXT)
+    memory.add_preference("ada", index, preference("red dress"))
+
+    reader = SQLiteStore(path)
+    assert reader.load_user("ada")["conversations"][0]["preferences"] == []
+    memory.flush_async().result()
+    assert reader.load_user("ada")["conversations"][0]["preferences"] == [
+        preference("red dress")
+    ]
+    reader.close()
+    memory.close()
+
+
+def test_reopened_memory_loads_only_the_requested_user(path):
+    memory = Memory(long_term_retrieval=False, store=SQLiteStore(path))
+    for name in ("ada", "grace"):
+        memory.create_user(user(name))
+        memory.add_preference(name, memory.create_conversation(name, CONTEXT), preference(name))
+    memory.close()  # flushes the pending preferences
+
+    memory = Memory(long_term_retrieval=False, store=SQLiteStore(path))
+    assert memory.list_user_names() == ["ada", "grace"]
+    assert memory.data == {}  # listing the users does not load them
+
+    assert memory.get_user("grace")["conversations"][0]["preferences"] == [
+        preference("grace")
+    ]
+    assert list(memory.data) == ["grace"]
+    assert memory.user_exists("ada") and not memory.user_exists("alan")
+    memory.close()
@@ -0,0 +1,50 @@
+"""Check that an outfit answer is parsed once into its parts"""
+
+import json
+
+from src.agent.generator.outfit import Outfit, parse_outfit
+
+FIELDS = dict(
+    top="White linen shirt",
+    bottom="Beige chinos",
+    footwear="Tan loafers",
+    accessories="Straw fedora",
+    suggestion="Tuck the shirt in loosely",
+    summary="A breezy summer outfit.",
+    image_prompt="white linen shirt, beige chinos, tan loafers, straw fedora",
+    memory_key="linen shirt with chinos",
+)
+
+
+def test_parse_json_answer():
+    outfit = parse_outfit(json.dumps(FIELDS))
+
+    assert outfit == Outfit(**FIELDS)
+    assert outfit.description.splitlines()[0] == "1. Top: White linen shirt"
+    assert outfit.text.endswith("Summary: A breezy summer outfit.")
+
+
+def test_missing_image_prompt_and_memory_key_are_derived():
+    fields = dict(FIELDS, image_prompt=None, bottom="**Beige** chinos, cropped")
+    del fields["memory_key"]
+    outfit = parse_outfit(json.dumps(fields))
+
+    assert outfit.bottom == "Beige chinos, cropped"
+    assert outfit.image_prompt.startswith("White linen shirt, Beige chinos, cropped")
+    assert outfit.memory_key == "White linen shirt with Beige chinos"
+
+
+def test_free_text_answer_is_parsed_as_fallback():
+    outfit = parse_outfit(
+        "1. **Top**: White linen shirt\n2. Bottom: Beige chinos\n"
+        "5. Suggestions: Roll the sleeves\nSummary: A light outfit."
+    )
+
+    assert (outfit.top, outfit.bottom) == ("White linen shirt", "Beige chinos")
+    assert outfit.suggestion == "Roll the sleeves"
+    assert outfit.summary == "A light outfit."
+
+
+def test_unstructured_text_is_kept():
+    outfit = parse_outfit("Just wear something comfortable.")
+    assert outfit.suggestion == outfit.summary == "Just wear something comfortable."
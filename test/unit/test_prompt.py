@@ -0,0 +1,38 @@
+"""Check that the outfit prompt is compacted to its token budget"""
+
+from src.agent.generator.prompt import build_prompt, dedupe, estimate_tokens
+
+
+def suggestion(i):
+    sections = f"1. Top: shirt number {i} in a long description of fabric and cut\n" * 5
+    return f"{sections}Summary: outfit {i} in short."
+
+
+def test_older_suggestions_are_summarized():
+    prompt = build_prompt("INSTRUCTIONS", {}, "party", [], [suggestion(i) for i in range(4)])
+
+    assert "outfit 0 in short." in prompt
+    assert "shirt number 0" not in prompt
+    assert "shirt number 3" in prompt  # the latest suggestion is kept in full
+
+
+def test_dedupe_keeps_highest_ranked():
+    memories = [
+        "Of the outfit 'red dress', the user thinks: love it",
+        "Of the outfit 'red dress', the user thinks: love it!",
+        "Of the outfit 'jeans', the user thinks: too casual",
+    ]
+    assert dedupe(memories) == [memories[0], memories[2]]
+
+
+def test_budget_drops_lowest_ranked_memories_first():
+    memories = [f"memory {i} " + "detail " * 20 for i in range(5)]
+    suggestions = [suggestion(i) for i in range(3)]
+    unbounded = build_prompt("INSTRUCTIONS", {}, "party", memories, suggestions)
+    budget = estimate_tokens(unbounded) - 60
+
+    prompt = build_prompt("INSTRUCTIONS", {}, "party", memories, suggestions, budget)
+
+    assert estimate_tokens(prompt) <= budget
+    assert "memory 0" in prompt and "memory 4" not in prompt
+    assert "outfit 0 in short." in prompt  # suggestions are only dropped after memories
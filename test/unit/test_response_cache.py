@@ -0,0 +1,57 @@
+"""Check matching, expiry and eviction of the response cache"""
+
+import numpy as np
+import pytest
+
+from src.agent.generator.cache import ResponseCache
+
+EMBEDDINGS = {
+    "party": [1.0, 0.0, 0.0],
+    "birthday party": [0.99, 0.1, 0.0],
+    "funeral": [0.0, 1.0, 0.0],
+}
+USER = dict(gender="female", height="170", body_type="slim")
+
+
+def embed(context):
+    return np.array(EMBEDDINGS[context["occasion"]])
+
+
+def context(occasion):
+    return dict(occasion=occasion, weather="sunny", style="casual")
+
+
+@pytest.fixture
+def cache():
+    cache = ResponseCache(embed=embed, threshold=0.95)
+    cache.put(USER, context("party"), ["likes red"], [], "red dress", latency=2.0)
+    return cache
+
+
+def test_similar_context_hits(cache):
+    assert cache.get(USER, context("birthday party"), ["likes red"], []) == "red dress"
+    assert cache.get(USER, context("funeral"), ["likes red"], []) is None
+    assert cache.stats["hit_rate"] == 0.5
+    assert cache.stats["saved_seconds"] == 2.0
+
+
+def test_attributes_and_memories_must_match(cache):
+    assert cache.get(USER, context("party"), ["likes blue"], []) is None
+    assert cache.get(dict(USER, height="180"), context("party"), ["likes red"], []) is None
+    assert cache.get(USER, context("party"), ["likes red"], ["red dress"]) is None
+
+
+def test_entries_expire(cache):
+    cache.ttl = 0.0
+    assert cache.get(USER, context("party"), ["likes red"], []) is None
+    assert cache.stats["entries"] == 0
+
+
+def test_least_recently_used_are_evicted(cache):
+    cache.max_entries = 2
+    cache.put(USER, context("funeral"), [], [], "black suit", latency=1.0)
+    cache.get(USER, context("party"), ["likes red"], [])  # now the most recent entry
+    cache.put(USER, context("birthday party"), [], [], "party hat", latency=1.0)
+
+    assert cache.get(USER, context("party"), ["likes red"], []) == "red dress"
+    assert cache.get(USER, context("funeral"), [], []) is None
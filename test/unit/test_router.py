@@ -0,0 +1,59 @@
+"""Check model routing and the latency fallback against a local stand-in for the Mistral API"""
+
+import time
+
+import pytest
+
+from src.agent.generator.router import LARGE_MODEL, SMALL_MODEL, ModelRouter
+
+
+def slow_large_model(handler, request):
+    """The large model stalls before answering, the small model answers right away"""
+    if request.body["model"] == LARGE_MODEL:
+        time.sleep(1.0)
+    handler.reply_completion(f"outfit by {request.body['model']}")
+
+
+@pytest.fixture
+def server_url(stub_server):
+    return stub_server(slow_large_model).url
+
+
+@pytest.fixture
+def generator(server_url, monkeypatch):
+    from src.agent.generator.generator import Generator
+
+    monkeypatch.setenv("MISTRAL_API_KEY", "test")
+    generator = Generator(server_url=server_url)
+    generator.router.latency_budget = 0.2
+    return generator
+
+
+def test_routes_refinements_to_small_model():
+    router = ModelRouter()
+    assert router.route([]).model == LARGE_MODEL
+    assert router.route(["earlier outfit"]).model == SMALL_MODEL
+    assert router.timeout_ms(router.decisions[-1]) is None  # nothing to fall back to
+
+
+def test_falls_back_when_over_budget(generator):
+    assert generator.generate_text("party", {}, [], []) == f"outfit by {SMALL_MODEL}"
+    assert generator.last_route.model == SMALL_MODEL
+    assert [d.model for d in generator.router.decisions] == [LARGE_MODEL, SMALL_MODEL]
+
+    stats = generator.router.stats
+    assert stats[LARGE_MODEL]["calls"] == 1 and stats[SMALL_MODEL]["calls"] == 1
+    assert generator.router.fallback_rate == 1.0
+
+
+def test_stream_falls_back_before_first_token(generator):
+    text = "".join(generator.generate_text_stream("party", {}, [], []))
+    assert text == f"outfit by {SMALL_MODEL}"
+    assert generator.last_route.model == SMALL_MODEL
+
+
+def test_budget_scales_with_outfits():
+    router = ModelRouter(latency_budget=2.0)
+    decision = router.route([])
+    assert router.timeout_ms(decision) == 2000
+    assert router.timeout_ms(decision, outfits=3) == 6000
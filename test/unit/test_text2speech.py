@@ -0,0 +1,88 @@
+"""Check that interrupting speech stops playback and drops everything queued before it"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+try:
+    from src.agent.text2speech import text2speech
+except OSError:  # sounddevice is installed, but the PortAudio library is not
+    pytest.skip("PortAudio library not found", allow_module_level=True)
+
+SAMPLE_RATE = 8000
+FRAMES = 400  # per callback, 50 ms
+
+
+class FakeOutputStream:
+    """Calls the stream callback in real time, like the output device would"""
+
+    def __init__(self, samplerate, channels, dtype, callback, finished_callback):
+        self.channels = channels
+        self.callback = callback
+        self.finished_callback = finished_callback
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def close(self):
+        pass
+
+    def _run(self):
+        while True:
+            out = np.zeros((FRAMES, self.channels), np.float32)
+            try:
+                self.callback(out, FRAMES, None, None)
+            except (text2speech.sd.CallbackStop, text2speech.sd.CallbackAbort):
+                break
+            time.sleep(FRAMES / SAMPLE_RATE)
+        self.finished_callback()
+
+
+@pytest.fixture
+def tts(monkeypatch):
+    monkeypatch.setattr(text2speech.sd, "OutputStream", FakeOutputStream)
+    tts = text2speech.Text2Speech()
+    tts.played = []
+
+    def render(text, cache=False):
+        tts.played.append(text)  # only the chunks that were not dropped are played
+        return np.zeros(SAMPLE_RATE, np.float32), SAMPLE_RATE  # one second
+
+    monkeypatch.setattr(tts, "render", render)
+    yield tts
+    tts.cleanup()
+
+
+def test_interrupt_stops_playback_and_drops_queued_speech(tts):
+    started = threading.Event()
+    tts.speak("The first message is long enough to be played on its own.", started.set)
+    tts.speak("The second message was queued before the interruption.")
+    assert started.wait(timeout=2.0)
+
+    start = time.perf_counter()
+    assert tts.interrupt()
+    assert tts.wait_until_done(timeout=2.0)
+    assert time.perf_counter() - start < 0.5  # well before the second ended
+    assert not tts.is_speaking
+
+    tts.played.clear()
+    tts.speak("Queued after the interruption.")
+    assert tts.wait_until_done(timeout=3.0)
+    assert tts.played == ["Queued after the interruption."]
+
+
+def test_interrupt_without_speech(tts):
+    assert not tts.interrupt()
+
+
+def test_cancelled_playback_ends_early(monkeypatch):
+    monkeypatch.setattr(text2speech.sd, "OutputStream", FakeOutputStream)
+    handle = text2speech.PlaybackHandle(np.zeros(10 * SAMPLE_RATE, np.float32), SAMPLE_RATE)
+    handle.start()
+    handle.cancel()
+
+    start = time.perf_counter()
+    assert handle.wait() is False
+    assert time.perf_counter() - start < 0.5